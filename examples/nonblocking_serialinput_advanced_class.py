@@ -32,8 +32,7 @@ class MyProjectMainClass:
         self.led.direction = digitalio.Direction.OUTPUT
 
         self.runtime_print = True
-        self.runtime_print_next = time.monotonic()
-        self.runtime_print_intervall = 1.0
+        self.runtime_task = self.my_input.scheduler.call_every(1.0, self.runtime_update)
 
     ##########################################
     # menu
@@ -47,7 +46,7 @@ class MyProjectMainClass:
             "- 'exit'  stop program"
             "".format(
                 runtime_print=self.runtime_print,
-                runtime_print_intervall=self.runtime_print_intervall,
+                runtime_print_intervall=self.runtime_task.intervall,
             )
         )
         self.my_input.print(text)
@@ -60,10 +59,7 @@ class MyProjectMainClass:
             self.my_input.print("time set:")
             value = nb_serialin.parse_value(input_string, "time set")
             if nb_serialin.is_number(value):
-                self.runtime_print_intervall = value
-                self.runtime_print_next = (
-                    time.monotonic() + self.runtime_print_intervall
-                )
+                self.runtime_task.intervall = value
         if "exit" in input_string:
             self.my_input.print("Stop Program running.")
             self.running = False
@@ -72,19 +68,15 @@ class MyProjectMainClass:
     # main things
 
     def runtime_update(self):
-        """If enabled: print runtime & toggle LED."""
+        """If enabled: print runtime & toggle LED. (called by the scheduler)"""
         if self.runtime_print:
-            if self.runtime_print_next < time.monotonic():
-                self.runtime_print_next = (
-                    time.monotonic() + self.runtime_print_intervall
-                )
-                self.my_input.print("{: > 7.2f}s".format(time.monotonic()))
-                self.led.value = not self.led.value
+            self.my_input.print("{: > 7.2f}s".format(time.monotonic()))
+            self.led.value = not self.led.value
 
     def update(self):
         """Update."""
+        # this also runs the scheduled runtime_update
         self.my_input.update()
-        self.runtime_update()
 
     def run(self):
         """Run."""
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# SPDX-FileCopyrightText: Copyright (c) 2021 Stefan Krüger for s-light
+#
+# SPDX-License-Identifier: Unlicense
+
+"""Run NonBlockingSerialInput on a desktop computer (host CPython) over a pty."""
+
+import time
+import sys
+import nonblocking_serialinput as nb_serialin
+from nonblocking_serialinput_host import StreamSerial
+
+##########################################
+# main
+
+
+def main():
+    """Main."""
+    backend, device_path = StreamSerial.open_pty()
+    print(42 * "*")
+    print("nonblocking_serialinput_host_pty.py")
+    print("Python Version: " + sys.version)
+    print("connect with: 'screen {}'".format(device_path))
+    print(42 * "*")
+
+    my_input = nb_serialin.NonBlockingSerialInput(
+        serial=backend,
+        output=backend,
+        statusline=True,
+    )
+    running = True
+    while running:
+        try:
+            my_input.update()
+            input_string = my_input.input()
+            if input_string is not None:
+                if "exit" in input_string:
+                    my_input.print("Stop Program running.")
+                    running = False
+                else:
+                    my_input.print("type 'exit' to stop the program.")
+            my_input.sleep_until_next_work(0.01)
+        except KeyboardInterrupt:
+            running = False
+    backend.close()
+    # give the terminal some time to read the last output
+    time.sleep(0.1)
+
+
+##########################################
+if __name__ == "__main__":
+    main()
+
+##########################################
@@ -28,15 +28,37 @@ Implementation Notes
 """
 
 import time
+import sys
+import array
+import struct
 
 # import supervisor
-import usb_cdc
 import ansi_escape_code as terminal
 
+try:
+    import usb_cdc
+except ImportError:
+    # we are not running on CircuitPython -
+    # use one of the host backends from `nonblocking_serialinput_host`
+    usb_cdc = None
+
+try:
+    import _thread
+except ImportError:
+    # no threads - no need for locking.
+    _thread = None
+
+# log levels - see `NonBlockingSerialInput.log`
+LOG_DEBUG = 10
+LOG_INFO = 20
+LOG_WARN = 30
+LOG_ERROR = 40
+LOG_OFF = 100
+
 __version__ = "1.0.0-auto.0"
 __repo__ = "https://github.com/s-light/CircuitPython_nonblocking_serialinput.git"
 
-# pylint: disable=too-many-instance-attributes
+# pylint: disable=too-many-instance-attributes, too-many-lines, too-many-public-methods
 
 ##########################################
 # NonBlockingSerialInput Class
@@ -55,24 +77,53 @@ class NonBlockingSerialInput:
     :param function input_handling_fn: function to call if there is one ore more
         fully received new lines. ``input_handling(input_string: string)``
         Default: None
+    :param bool input_handling_view: call ``input_handling_fn`` with a ``memoryview``
+        of the raw (encoded) line bytes in the receive buffer instead of a new string.
+        the view is only valid during the callback - copy what you need to keep.
+        Default: False
     :param function print_help_fn: function to call when a help text should be printed
         fully received new lines. ``print_help()``
         Default: None
-    :param ~usb_cdc.Serial serial: serial connection object to use
+    :param ~usb_cdc.Serial serial: serial connection object to use.
+        any object with ``connected``, ``in_waiting``, ``timeout`` and ``read(size)``
+        works - on host CPython use the backends in `nonblocking_serialinput_host`.
         Default: usb_cdc.console
+        (on host CPython: `nonblocking_serialinput_host.StreamSerial` reading stdin -
+        call `deinit` at the end to restore the terminal settings)
+    :param ~usb_cdc.Serial output: serial connection object for all output.
+        any object with ``write(buffer)`` works. (for example the host backends)
+        ignored if ``console`` is given - the console has its own output.
+        Default: None (use the build in ``print`` - that is the console)
+    :param SharedConsole console: console shared with other instances.
+        all output is arbitrated there - see `SharedConsole`.
+        Default: None (a private console)
+    :param bool threaded: allow to call ``print`` from other threads.
+        (only for the private console - see `SharedConsole` ``threaded``)
+        Default: False
+    :param int scrollback_size: keep the last printed bytes and replay them
+        when the host connects.
+        (only for the private console - see `SharedConsole` ``scrollback_size``)
+        Default: 0 (off)
     :param bool echo: enable/disable remote echo
         Default: True
     :param string echo_pre_text: Text to put on line start if echo is active
         Default: ">> "
+    :param bool echo_incremental: only write the new characters while typing.
+        the full statusline & echo line is only redrawn if something else changed.
+        Default: True
     :param string statusline: enable/disable status line handling - `Not implemented yet - issue #1:
         <https://github.com/s-light/CircuitPython_nonblocking_serialinput/issues/1>`_
         Default: None
     :param function statusline_fn: callback function for statusline output.
         must return the string to use as statusline. ``def statusline_fn() string:``
-        Default: "uptime:{runtime}"
+        (or an encoded buffer - like the one of a `StatuslineTemplate`)
+        the result is cached and reused for all redraws until the next intervall
+        or until `statusline_invalidate` is called.
+        Default: "uptime:{uptime: >11.2f}"
     :param string statusline_intervall: time intervall in seconds to update the statusline
+        set to ``None`` to only update on `statusline_invalidate` / `statusline_set`.
         Default: 1s
-    :param string encoding: input string encoding
+    :param string encoding: input string encoding. has to be ASCII compatible.
         Default: "utf-8"
     :param string, list line_end_custom: set custom line ends
         Default: None
@@ -82,7 +133,86 @@ class NonBlockingSerialInput:
     :param bool use_universal_line_end_advanced:  use a advanced default set of line_ends
         ``['\v', '\f', '\x1c',...]``
         Default: False
-    :param bool verbose: print debugging information in some internal functions. Default to False
+    :param bool verbose: print debugging information in some internal functions.
+        (same as ``log_level=LOG_DEBUG``) Default to False
+    :param int log_level: messages below this level are suppressed.
+        (``LOG_DEBUG``, ``LOG_INFO``, ``LOG_WARN``, ``LOG_ERROR``, ``LOG_OFF``)
+        Default: LOG_INFO
+    :param bool log_color: color the log messages by level. Default: False
+    :param string log_command: input command to change the ``log_level`` at runtime.
+        ``loglevel debug`` or ``loglevel 10`` sets the level -
+        ``loglevel`` alone prints the current level.
+        these lines are not passed on to the ``input_handling_fn``.
+        Default: None (off)
+    :param UpdateProfiler profiler: optional profiler / hook object.
+        ``profiler.begin(name)`` is called before and ``profiler.end(name, token)``
+        after every ``update()`` stage and every user callback.
+        if it has ``profiler.add(name, duration_ns)`` the queue wait time of every
+        handled line is added as ``queue_wait``.
+        (see `UpdateProfiler` for the available stage names)
+        Default: None
+    :param FlowControl flow_control: pause the sender if too much input is buffered.
+        (see `FlowControl`)
+        Default: None
+    :param Telemetry telemetry: telemetry channels written on every ``update()``.
+        (see `Telemetry`)
+        Default: None
+    :param int buffer_size: preallocate a fixed receive buffer of this size in bytes.
+        this is also the budget for all queued lines and the incomplete line.
+        if it is used up by unhandled lines the rest stays in the serial buffer.
+        Default: None (grow as needed)
+    :param int max_line_length: maximum line length in bytes.
+        (with ``buffer_size`` it is at most ``buffer_size - 1``)
+        Default: None (no limit)
+    :param string overflow_mode: what to do with too long lines:
+        ``"truncate"`` (keep the start) or ``"discard"`` (drop the line).
+        Default: "truncate"
+    :param function overflow_fn: called on every dropped or truncated line.
+        ``overflow_fn(kind: string, overflow_count: int)``;
+        kind is ``"line"`` (too long) or ``"queue"`` (buffer budget exceeded)
+        Default: None
+    :param bool bracketed_paste: enable the terminal bracketed paste mode.
+        pasted text is marked by the terminal - it is handled without echo
+        and a single summary line is printed at the end. (see ``paste_summary_text``)
+        the terminal keeps the mode until `deinit` switches it off again.
+        Default: False
+    :param int paste_line_threshold: handle a single read with at least this many lines
+        like a paste. (for terminals without bracketed paste) Default: None (off)
+    :param string paste_summary_text: printed after a paste is handled.
+        ``{lines}`` is replaced with the number of pasted lines.
+        Default: "[pasted {lines} lines]"
+    :param float escape_timeout: time in seconds to wait for the rest of a split
+        escape sequence before it is handled as normal input. Default: 0.1
+    :param float line_idle_timeout: time in seconds without new input after which
+        the incomplete line is handled as a completed line.
+        (for devices that send records without line end)
+        Default: None (off)
+    :param int line_idle_min_length: only complete lines with at least this many bytes
+        on the idle timeout - so half typed input is not cut off.
+        Default: 1
+    :param list priority_commands: lines that are handled before all queued lines.
+        (compared to the whole line without surrounding whitespace - ``["stop"]``)
+        see `set_priority`.
+        Default: None
+    :param string priority_prefix: lines starting with this are handled
+        before all queued lines. (passed on with the prefix - ``"!"``)
+        Default: None
+    :param string request_id_prefix: enable the request / response mode:
+        a line ``#42 command`` (with ``request_id_prefix="#"``) is passed on as
+        ``command``; everything printed while it is handled starts with ``#42``
+        and ``request_done_text`` is printed at the end.
+        so a host can send many commands without waiting for each response.
+        Default: None (off)
+    :param string request_done_text: printed after a request was handled.
+        ``{prefix}`` and ``{id}`` are replaced. Default: "{prefix}{id}."
+    :param bool terminal_size_query: ask the terminal for its size
+        (cursor position report) on start and on connect.
+        the statusline & echo line are then cut / scrolled to fit in one row.
+        (see `query_terminal_size` and `SharedConsole` ``columns``)
+        Default: False
+    :param float terminal_size_intervall: ask again every intervall seconds -
+        to notice a resized terminal. (only with ``terminal_size_query``)
+        Default: None (off)
 
     """
 
@@ -90,10 +220,16 @@ class NonBlockingSerialInput:
         self,
         *,  # force keyword arguments
         input_handling_fn=None,
+        input_handling_view=False,
         print_help_fn=None,
-        serial=usb_cdc.console,
+        serial=None,
+        output=None,
+        console=None,
+        threaded=False,
+        scrollback_size=0,
         echo=True,
         echo_pre_text=">> ",
+        echo_incremental=True,
         statusline=False,
         statusline_fn=None,
         statusline_intervall=1,
@@ -102,53 +238,281 @@ class NonBlockingSerialInput:
         use_universal_line_end_basic=True,
         use_universal_line_end_advanced=False,
         verbose=False,
+        log_level=LOG_INFO,
+        log_color=False,
+        log_command=None,
+        profiler=None,
+        flow_control=None,
+        telemetry=None,
+        buffer_size=None,
+        max_line_length=None,
+        overflow_mode="truncate",
+        overflow_fn=None,
+        bracketed_paste=False,
+        paste_line_threshold=None,
+        paste_summary_text="[pasted {lines} lines]",
+        escape_timeout=0.1,
+        line_idle_timeout=None,
+        line_idle_min_length=1,
+        priority_commands=None,
+        priority_prefix=None,
+        request_id_prefix=None,
+        request_done_text="{prefix}{id}.",
+        terminal_size_query=False,
+        terminal_size_intervall=None,
     ):
+        # pylint: disable=too-many-locals,too-many-statements,too-many-branches
         super()
         self.input_handling_fn = input_handling_fn
+        self.input_handling_view = input_handling_view
         self.print_help_fn = print_help_fn
+        # serial object created here - `deinit` closes it.
+        self._serial_owned = None
+        if serial is None:
+            if usb_cdc:
+                serial = usb_cdc.console
+            else:
+                # pylint: disable=import-outside-toplevel
+                from nonblocking_serialinput_host import StreamSerial
+
+                serial = StreamSerial()
+                self._serial_owned = serial
         self.serial = serial
+        if console is None:
+            console = SharedConsole(
+                output=output,
+                encoding=encoding,
+                auto_flush=True,
+                threaded=threaded,
+                scrollback_size=scrollback_size,
+            )
+        self.console = console
         self.echo = echo
         self.echo_pre_text = echo_pre_text
-        self.statusline = statusline
+        self.echo_incremental = echo_incremental
+        self._statusline = statusline
         if statusline_fn:
             self.statusline_fn = statusline_fn
         else:
+            self._statusline_template = StatuslineTemplate(
+                "uptime:{uptime: >11.2f}", encoding=encoding
+            )
             self.statusline_fn = self._statusline_fn_default
+        self.scheduler = Scheduler()
+        self._statusline_task = None
+        self._statusline_intervall = None
         self.statusline_intervall = statusline_intervall
-        self.statusline_next_update = time.monotonic()
+        self._statusline_cache = None
         self.encoding = encoding
-        self.line_end_list = []
-        if line_end_custom:
-            self.line_end_list.extend(line_end_custom)
-        if use_universal_line_end_basic:
-            self.line_end_list.extend(universal_line_end_basic)
-        if use_universal_line_end_advanced:
-            self.line_end_list.extend(universal_line_end_advanced)
-        self.verbose = verbose
+        self.log_level = log_level
+        if verbose:
+            self.log_level = LOG_DEBUG
+        self.log_color = log_color
+        self.log_command = log_command
+        self.profiler = profiler
+        self.flow_control = flow_control
+        self.telemetry = telemetry
+        if overflow_mode not in ("truncate", "discard"):
+            raise ValueError("overflow_mode must be 'truncate' or 'discard'")
+        self.buffer_size = buffer_size
+        if buffer_size:
+            if max_line_length is None or max_line_length >= buffer_size:
+                # we need at least one free byte to receive the line end.
+                max_line_length = buffer_size - 1
+        self.max_line_length = max_line_length
+        self.overflow_mode = overflow_mode
+        self.overflow_fn = overflow_fn
+        # number of dropped or truncated lines
+        self.overflow_count = 0
 
         # no block:
         self.serial.timeout = 0
-        self.input_buffer = ""
+        self._connected = self.serial.connected
+        # a board can boot without host - keep the output for the connect.
+        self.console.set_connected(self._connected)
+        self._serial_readinto = hasattr(self.serial, "readinto")
+        # receive buffer:
+        # ``[_rx_start:_rx_end]`` is the current incomplete line.
+        # before that are the completed lines listed in _rx_lines
+        # (only used with input_handling_view)
+        self._rx = bytearray(buffer_size or 64)
+        self._rx_start = 0
+        self._rx_end = 0
+        # the incomplete line is too long and was already counted.
+        self._rx_overflow = False
+        # flat list of the completed lines in _rx: [start, end, start, end, ...]
+        self._rx_lines = []
+        # encoded size of all queued lines
+        self._queued_bytes = 0
+        # sequence numbers: lines queued / dequeued since start
+        self._lines_queued = 0
+        self._lines_dequeued = 0
+        # arrival time (monotonic_ns) of every queued line - parallel to the queue
+        self._line_times = []
+        # arrival time & queue wait time of the line handled last
+        self.line_time_ns = None
+        self.line_wait_ns = None
+        # script runner - see run_script
+        self._script_file = None
+        self._script_buffer = None
+        self._script_start = 0
+        self._script_end = 0
+        self._script_eof = False
+        self._script_skip = False
+        self.script_lines_per_update = 10
+        self.script_line_count = 0
+        # request / response mode
+        self.request_id_prefix = request_id_prefix
+        self.request_done_text = request_done_text
+        # id of the request that is handled right now
+        self.request_id = None
+        # thread that handles the request - only its output is tagged
+        self._request_thread = None
+        # terminal size
+        self.terminal_size_query = terminal_size_query
+        self._size_query_pending = False
+        # escape sequence start waiting for the rest
+        self._esc_pending = b""
+        self._esc_pending_ns = 0
+        self.escape_timeout = escape_timeout
+        # idle line completion
+        self.line_idle_timeout = line_idle_timeout
+        self.line_idle_min_length = line_idle_min_length
+        self._rx_last_ns = 0
+        # priority lane: encoded lines - handled before input_list / _rx_lines
+        self._priority_lines = []
+        self._priority_times = []
+        self.set_priority(commands=priority_commands, prefix=priority_prefix)
+        # paste handling
+        self._bracketed_paste = bracketed_paste
+        self.paste_line_threshold = paste_line_threshold
+        self.paste_summary_text = paste_summary_text
+        self._paste_active = False
+        self._paste_implicit = False
+        # pasted lines are the sequence numbers [_paste_first:_paste_last]
+        self._paste_first = 0
+        self._paste_last = 0
+        self._paste_summary_pending = False
+        # decoded input_buffer - None if outdated
+        self._input_buffer = ""
         self.input_list = []
+        self._line_end_matcher = None
+        self.set_line_ends(
+            line_end_custom=line_end_custom,
+            use_universal_line_end_basic=use_universal_line_end_basic,
+            use_universal_line_end_advanced=use_universal_line_end_advanced,
+        )
+        self.console.register(self)
+        if bracketed_paste:
+            self._write(BRACKETED_PASTE_ENABLE)
+        self._terminal_size_task = None
+        if terminal_size_query:
+            self.query_terminal_size()
+            if terminal_size_intervall is not None:
+                self._terminal_size_task = self.scheduler.call_every(
+                    terminal_size_intervall, self.query_terminal_size
+                )
+
+    def deinit(self):
+        """
+        Release the terminal.
+
+        switches the bracketed paste mode off again, stops a running script
+        and the terminal size query and removes this instance from the console.
+        a default ``StreamSerial`` created on host CPython is closed -
+        this restores the terminal settings of stdin.
+        """
+        if self._bracketed_paste:
+            self._write(BRACKETED_PASTE_DISABLE)
+            self._bracketed_paste = False
+        if self._terminal_size_task:
+            self._terminal_size_task.cancel()
+            self._terminal_size_task = None
+        self.script_stop()
+        self.console.unregister(self)
+        if self._serial_owned is not None:
+            self._serial_owned.close()
+            self._serial_owned = None
 
     ##########################################
     # output handling
     # statusline
     # echo
 
-    @staticmethod
-    def _statusline_fn_default():
+    def _statusline_fn_default(self):
         """Default statusline"""
-        return "uptime:{uptime: >8.2f}".format(uptime=time.monotonic())
+        self._statusline_template.set("uptime", time.monotonic())
+        return self._statusline_template.buffer
+
+    @property
+    def statusline(self):
+        """Show the statusline. (the intervall updates only run while it is shown)"""
+        return self._statusline
+
+    @statusline.setter
+    def statusline(self, value):
+        self._statusline = value
+        self._statusline_schedule()
+
+    @property
+    def statusline_intervall(self):
+        """Time intervall in seconds to update the statusline. (``None``: disabled)"""
+        return self._statusline_intervall
+
+    @statusline_intervall.setter
+    def statusline_intervall(self, value):
+        self._statusline_intervall = value
+        self._statusline_schedule()
+
+    def _statusline_schedule(self):
+        """(Re)start the intervall updates - only while the statusline is shown."""
+        if self._statusline_task:
+            self._statusline_task.cancel()
+            self._statusline_task = None
+        if self._statusline and self._statusline_intervall is not None:
+            self._statusline_task = self.scheduler.call_every(
+                self._statusline_intervall, self._statusline_update_intervall, delay=0
+            )
 
-    def _statusline_update_check_intervall(self):
-        """Update the Statusline if intervall is over."""
-        if self.statusline and self.statusline_next_update <= time.monotonic():
-            self.statusline_next_update = time.monotonic() + self.statusline_intervall
+    def _statusline_update_intervall(self):
+        """Update the Statusline - called by the scheduler every intervall."""
+        if self.statusline:
+            self._statusline_cache = None
             self.print(content=None)
 
     def _get_statusline(self):
-        return self.statusline_fn()
+        if self._statusline_cache is None:
+            self._statusline_cache = self._call_profiled(
+                "statusline_fn", self.statusline_fn
+            )
+        return self._statusline_cache
+
+    def statusline_invalidate(self, redraw=True):
+        """
+        Mark the cached statusline as outdated.
+
+        ``statusline_fn`` is called again on the next redraw.
+
+        :param bool redraw: redraw the statusline now. (default: True)
+        """
+        self._statusline_cache = None
+        if redraw:
+            self.statusline_print()
+
+    def statusline_set(self, text, redraw=True):
+        """
+        Set the statusline content directly (push-style).
+
+        the text is used for all redraws until the next intervall update
+        or `statusline_invalidate` call.
+        combine with ``statusline_intervall=None`` to only show pushed content.
+
+        :param string text: new statusline content
+        :param bool redraw: redraw the statusline now. (default: True)
+        """
+        self._statusline_cache = text
+        if redraw:
+            self.statusline_print()
 
     def _get_echo_line(self):
         text = "{echo_pre_text}{input_buffer}".format(
@@ -167,7 +531,150 @@ class NonBlockingSerialInput:
         if self.echo:
             self.print(content=None)
 
-    def print(self, *args, content=True):
+    ##########################################
+    # logging
+
+    @property
+    def verbose(self):
+        """Debug messages are shown. (``log_level`` is ``LOG_DEBUG``)"""
+        return self.log_level <= LOG_DEBUG
+
+    @verbose.setter
+    def verbose(self, value):
+        self.log_level = LOG_DEBUG if value else LOG_INFO
+
+    def log(self, level, text, *args):
+        r"""
+        Print a message if level is at least ``log_level``.
+
+        the message is only formatted if it is printed -
+        so suppressed messages just cost a comparison.
+
+        :param int level: message level. (``LOG_DEBUG`` ... ``LOG_ERROR``)
+        :param string text: message - with ``args`` formatted in (``text.format(*args)``)
+        :param object \*args: values for the message.
+        """
+        if level < self.log_level:
+            return
+        if args:
+            text = text.format(*args)
+        prefix = _LOG_PREFIX.get(level, "")
+        if self.log_color and level in _LOG_COLOR:
+            self.print(_LOG_COLOR[level], prefix, text, _LOG_COLOR_RESET, sep="")
+        else:
+            self.print(prefix, text, sep="")
+
+    def debug(self, text, *args):
+        r"""Log a message with level ``LOG_DEBUG``. (see `log`)"""
+        if self.log_level <= LOG_DEBUG:
+            self.log(LOG_DEBUG, text, *args)
+
+    def info(self, text, *args):
+        r"""Log a message with level ``LOG_INFO``. (see `log`)"""
+        if self.log_level <= LOG_INFO:
+            self.log(LOG_INFO, text, *args)
+
+    def warn(self, text, *args):
+        r"""Log a message with level ``LOG_WARN``. (see `log`)"""
+        if self.log_level <= LOG_WARN:
+            self.log(LOG_WARN, text, *args)
+
+    def error(self, text, *args):
+        r"""Log a message with level ``LOG_ERROR``. (see `log`)"""
+        if self.log_level <= LOG_ERROR:
+            self.log(LOG_ERROR, text, *args)
+
+    def _handle_log_command(self, line):
+        """
+        Handle the ``log_command``. (line: string or memoryview)
+
+        :return bool: True if the line was the command.
+        """
+        command = self.log_command
+        if not command:
+            return False
+        if not isinstance(line, str):
+            if len(line) > len(command) + 8:
+                return False
+            line = self._decode(line)
+        if not line.startswith(command):
+            return False
+        words = line.split()
+        if not words or words[0] != command:
+            return False
+        if len(words) > 1:
+            value = words[1].upper()
+            if value in _LOG_LEVEL_NAMES:
+                self.log_level = _LOG_LEVEL_NAMES[value]
+            else:
+                try:
+                    self.log_level = int(value)
+                except ValueError:
+                    self.print("{}: unknown level '{}'".format(command, words[1]))
+                    return True
+        self.print("{}: {}".format(command, self.log_level))
+        return True
+
+    ##########################################
+    # request / response
+
+    def _request_begin(self, line):
+        """
+        Take the request id from line. (string or memoryview)
+
+        :return: line without the id.
+        """
+        self.request_done()
+        prefix = self.request_id_prefix
+        if not prefix:
+            return line
+        if _thread:
+            self._request_thread = _thread.get_ident()
+        if isinstance(line, str):
+            if not line.startswith(prefix):
+                return line
+            parts = line[len(prefix) :].split(" ", 1)
+            self.request_id = parts[0]
+            return parts[1] if len(parts) > 1 else ""
+        prefix = prefix.encode(self.encoding)
+        if line[: len(prefix)] != prefix:
+            return line
+        space = _find_byte(line, 0x20, len(prefix), len(line))
+        if space < 0:
+            self.request_id = self._decode(line[len(prefix) :])
+            return line[len(line) :]
+        self.request_id = self._decode(line[len(prefix) : space])
+        return line[space + 1 :]
+
+    def request_done(self):
+        """
+        Finish the current request - print ``request_done_text``.
+
+        called automatically after the ``input_handling_fn`` returned.
+        with `input` call this after the response is printed.
+        (otherwise the next `input` call does it)
+        """
+        if self.request_id is None:
+            return
+        request_id = self.request_id
+        self.request_id = None
+        self.print(
+            self.request_done_text.format(prefix=self.request_id_prefix, id=request_id)
+        )
+
+    def _call_input_handling_fn(self, line):
+        """Call the ``input_handling_fn`` for one line. (string or memoryview)"""
+        line = self._request_begin(line)
+        try:
+            if not self._handle_log_command(line):
+                self._call_profiled("input_handling_fn", self.input_handling_fn, line)
+        finally:
+            self.request_done()
+
+    ##########################################
+    # print
+
+    def print(self, *args, content=True, sep=" "):
         # def print(self, *args, end="\n"):
         r"""
         Print information & variables to the connected serial.
@@ -178,50 +685,37 @@ class NonBlockingSerialInput:
 
         currently it is not supported to print without newline at  end.
 
-        :param object \*args: things to print
+        :param object \*args: things to print.
+            a ``memoryview`` is written as encoded text without a copy.
+            during a request the output of the handling thread is tagged with its id.
         :param bool content: if false just update statusline & echo (default: True).
+        :param string sep: separator between the args (default: " ").
         """
         # :param bool end: line end character to print. Default: "\n"
-        if self.echo or self.statusline:
-            move = ""
-            if self.echo:
-                # earease echoline
-                move += terminal.ANSIControl.erase_line(2)
-            if self.statusline:
-                if self.echo:
-                    move += terminal.ANSIControl.cursor.previous_line(1)
-                # earease statusline
-                move += terminal.ANSIControl.erase_line(2)
-                # if self.echo:
-                #     move += terminal.ANSIControl.cursor.next_line(1)
-            # move += terminal.ANSIControl.cursor.position("1, 1")
-            move += terminal.ANSIControl.cursor.horizontal_absolute(1)
-            # print("\n\n\n{}\n\n\n".format(repr(move)))
-            print(move, end="")
-            if content:
-                # *normally print output
-                print(*args)
-            # time.sleep(0.)
-            # print("*", end="")
-            # print(*args, end=end)
-            # print statement is finished.
-            # now we have to reprint echo & statusline
-            if self.statusline:
-                if self.echo:
-                    print(self._get_statusline())
-                else:
-                    print(self._get_statusline(), end="")
-                    # print(terminal.ANSIControl.cursor.next_line(1), end="")
-            if self.echo:
-                print(terminal.ANSIControl.cursor.horizontal_absolute(1), end="")
-                print(self._get_echo_line(), end="")
-                # print(self._get_echo_line())
-            # if not self.echo and not self.statusline:
-            #     # add new end
-            #     print()
-        else:
-            # print(*args, end)
-            print(*args)
+        if (
+            self.request_id is not None
+            and content
+            and (
+                self._request_thread is None
+                or _thread.get_ident() == self._request_thread
+            )
+        ):
+            # one tagged line - so the tag is separated with a space in every case.
+            text = sep.join(
+                self._decode(arg) if isinstance(arg, memoryview) else str(arg)
+                for arg in args
+            )
+            args = (self.request_id_prefix + self.request_id + " " + text,)
+        self.console.print(*args, content=content, sep=sep)
+
+    @property
+    def output(self):
+        """Output object of the console. (``None``: build in print)"""
+        return self.console.output
+
+    def _write(self, text):
+        """Write text to the output. (raw - no statusline / echo handling)"""
+        self.console.write(text)
 
     # def out(self):
     #     pass
@@ -229,46 +723,517 @@ class NonBlockingSerialInput:
     ##########################################
     # input handling
 
-    def _buffer_count_line_ends(self):
-        result = 0
-        for end in self.line_end_list:
-            if end in self.input_buffer:
-                result += 1
-        return result
+    @property
+    def line_end_list(self):
+        """
+        List of all active line ends.
+
+        this is the canonical list (see `normalize_line_end_list`).
+        assign a new list to change the line ends -
+        this recompiles the internal `LineEndMatcher`.
+        (changing the returned list in place has no effect.)
+        """
+        return self._line_end_matcher.line_end_list
+
+    @line_end_list.setter
+    def line_end_list(self, value):
+        # build the new matchers completely before we switch over -
+        # so the old ones stay usable until then.
+        matcher = LineEndMatcher(value)
+        # the receive buffer holds the encoded bytes.
+        rx_matcher = LineEndMatcher(
+            [line_end.encode(self.encoding) for line_end in matcher.line_end_list]
+        )
+        self._line_end_matcher = matcher
+        self._rx_line_end_matcher = rx_matcher
+        if self._rx_end > self._rx_start:
+            # the new line ends could already be in the buffer.
+            self._rx_split_lines()
+
+    def set_line_ends(
+        self,
+        *,  # force keyword arguments
+        line_end_custom=None,
+        use_universal_line_end_basic=True,
+        use_universal_line_end_advanced=False,
+    ):
+        """
+        Change the active line ends at runtime.
+
+        the parameters are the same as for the constructor.
+        the combined list is deduplicated and compiled once.
+
+        :param string, list line_end_custom: set custom line ends
+            Default: None
+        :param bool use_universal_line_end_basic: use the basic default set of line_ends
+            Default: True
+        :param bool use_universal_line_end_advanced: use the advanced default set of line_ends
+            Default: False
+        """
+        line_end_list = []
+        if line_end_custom:
+            line_end_list.extend(line_end_custom)
+        if use_universal_line_end_basic:
+            line_end_list.extend(universal_line_end_basic)
+        if use_universal_line_end_advanced:
+            line_end_list.extend(universal_line_end_advanced)
+        self.line_end_list = line_end_list
+
+    def set_priority(self, *, commands=None, prefix=None):
+        """
+        Change the priority lane at runtime.
+
+        priority lines are detected as soon as they are complete and are handled
+        before all other queued lines - so the reaction time does not depend on the
+        backlog. (like a ``stop`` command after a large paste)
+        in input_list mode the serial is also checked for new priority lines
+        between the handling of two queued lines.
+
+        :param list commands: lines that are priority lines. Default: None
+        :param string prefix: lines starting with this are priority lines. Default: None
+        """
+        self._priority_commands = None
+        self._priority_max_length = 0
+        if commands:
+            self._priority_commands = [
+                command.strip().encode(self.encoding) for command in commands
+            ]
+            # longer lines can not be a command - with some room for whitespace.
+            self._priority_max_length = (
+                max(len(command) for command in self._priority_commands) + 8
+            )
+        self._priority_prefix = None
+        if prefix:
+            self._priority_prefix = prefix.encode(self.encoding)
+
+    @property
+    def priority_enabled(self):
+        """Priority commands or prefix are set."""
+        return bool(self._priority_commands or self._priority_prefix)
+
+    def _rx_is_priority(self, line_start, line_end):
+        """``_rx[line_start:line_end]`` is a priority line."""
+        buffer = self._rx
+        prefix = self._priority_prefix
+        if prefix and buffer[line_start : line_start + len(prefix)] == prefix:
+            return True
+        return bool(
+            self._priority_commands
+            and line_end - line_start <= self._priority_max_length
+            and bytes(buffer[line_start:line_end]).strip() in self._priority_commands
+        )
+
+    def _handle_priority(self):
+        """Handle all pending priority lines."""
+        lines = self._priority_lines
+        while lines:
+            line = lines.pop(0)
+            self._line_taken(self._priority_times.pop(0))
+            if self.input_handling_view:
+                line = memoryview(line)
+            else:
+                line = self._decode(line)
+            self._echo_input(line)
+            self._call_input_handling_fn(line)
+
+    @property
+    def input_buffer(self):
+        """The current incomplete input line."""
+        if self._input_buffer is None:
+            end = _utf8_complete_end(self._rx, self._rx_start, self._rx_end)
+            self._input_buffer = self._decode(
+                memoryview(self._rx)[self._rx_start : end]
+            )
+        return self._input_buffer
+
+    @input_buffer.setter
+    def input_buffer(self, value):
+        data = value.encode(self.encoding)
+        self._rx_end = self._rx_start
+        size = self._rx_reserve(len(data))
+        self._rx[self._rx_start : self._rx_start + size] = data[:size]
+        self._rx_end = self._rx_start + size
+        self._rx_overflow = False
+        self._input_buffer = None
 
     def _buffer_endswith_line_end(self):
-        # in python3 endswith() supports a tuple as argument
-        # in micropython/CircuitPython we have to do it manually..
-        # https://forum.micropython.org/viewtopic.php?t=4906
-        #
-        # we use a while loop to finish earlie
-        # https://stackoverflow.com/a/59092738/574981
-        result = None
-        i = iter(self.line_end_list)
-        while result is None and (end := next(i, None)) is not None:
-            if self.input_buffer.endswith(end):
-                result = end
-        return result
+        return self._rx_line_end_matcher.endswith(
+            memoryview(self._rx)[self._rx_start : self._rx_end]
+        )
+
+    def _rx_reserve(self, count):
+        """
+        Make room for count more bytes at the end of the receive buffer.
 
-    def _buffer_check_and_handle_line_ends(self):
-        if self._buffer_count_line_ends():
-            lines, rest = splitlines_advanced(self.input_buffer, self.line_end_list)
-            self.input_list.extend(lines)
-            if self.verbose:
-                print("lines: {}; rest: {}".format(repr(lines), repr(rest)))
-                print("self.input_list: {}".format(repr(self.input_list)))
-            if rest:
-                self.input_buffer = rest
+        :return int: number of bytes that fit.
+            (only less than count with a fixed ``buffer_size``)
+        """
+        if self._rx_end + count <= len(self._rx):
+            return count
+        self._rx_compact()
+        free = len(self._rx) - self._rx_end
+        if free >= count:
+            return count
+        if self.buffer_size:
+            return free
+        self._rx.extend(bytearray(max(count - free, len(self._rx))))
+        return count
+
+    def _rx_compact(self):
+        """Move the incomplete line to the buffer start - if no completed lines are left."""
+        if self._rx_lines or not self._rx_start:
+            return
+        length = self._rx_end - self._rx_start
+        if length:
+            self._rx[0:length] = self._rx[self._rx_start : self._rx_end]
+        self._rx_start = 0
+        self._rx_end = length
+
+    def _rx_read(self, count):
+        """
+        Read up to count bytes from serial into the receive buffer.
+
+        :return int: start index of the new data; ``None`` if the buffer is full.
+        """
+        pending = len(self._esc_pending)
+        count = self._rx_reserve(count + pending) - pending
+        if count <= 0:
+            return None
+        end = self._rx_end
+        if pending:
+            # rescan the incomplete escape sequence together with the new data.
+            self._rx[end : end + pending] = self._esc_pending
+            self._esc_pending = b""
+            self._rx_end += pending
+            self._input_buffer = None
+            end += pending
+        if self._serial_readinto:
+            count = self.serial.readinto(memoryview(self._rx)[end : end + count])
+        else:
+            raw = self.serial.read(count)
+            count = len(raw)
+            self._rx[end : end + count] = raw
+        if count:
+            self._rx_end = end + count
+            self._input_buffer = None
+        return end - pending
+
+    def _rx_handle_escape(self, start):
+        """Handle escape sequences in the new data ``[start:_rx_end]``."""
+        buffer = self._rx
+        index = _find_byte(buffer, 0x1B, start, self._rx_end)
+        while index > -1:
+            end = self._rx_end
+            found = None
+            for sequence in (PASTE_START, PASTE_END):
+                size = len(sequence)
+                if end - index >= size:
+                    if buffer[index : index + size] == sequence:
+                        found = sequence
+                        break
+                elif sequence.startswith(bytes(buffer[index:end])):
+                    self._rx_escape_wait(index, end)
+                    return
+            if found:
+                # lines before the marker belong to the state before it.
+                self._rx_split_lines(index)
+                self._rx_remove(index, len(found))
+                if found is PASTE_START:
+                    self._paste_begin(self._lines_queued)
+                else:
+                    self._paste_end()
             else:
-                self.input_buffer = ""
-
-    def _buffer_handle_backspace(self):
-        if "\x08" in self.input_buffer:
-            while (pos := self.input_buffer.find("\x08")) > -1:
-                # strip character before backspace and backspace itself.
-                self.input_buffer = (
-                    self.input_buffer[: pos - 1] + self.input_buffer[pos + 1 :]
-                )
+                index = self._rx_handle_report(index, end)
+                if index is None:
+                    return
+            index = _find_byte(buffer, 0x1B, index, self._rx_end)
+
+    def _rx_escape_wait(self, index, end):
+        """Keep the incomplete escape sequence ``[index:end]`` until the rest arrives."""
+        self._esc_pending = bytes(self._rx[index:end])
+        self._esc_pending_ns = time.monotonic_ns()
+        self._rx_end = index
+        self._input_buffer = None
+
+    def _rx_handle_report(self, index, end):
+        """
+        Handle a terminal report at index.
+
+        :return int: index to continue the search; ``None`` if waiting for the rest.
+        """
+        size = 0
+        if self._size_query_pending:
+            size = self._rx_parse_size_report(index, end)
+        if size < 0:
+            self._rx_escape_wait(index, end)
+            return None
+        if size:
+            self._rx_remove(index, size)
+            return index
+        return index + 1
+
+    def _rx_remove(self, index, size):
+        """Remove ``_rx[index:index + size]`` from the incomplete line."""
+        end = self._rx_end
+        self._rx[index : end - size] = self._rx[index + size : end]
+        self._rx_end = end - size
+        self._input_buffer = None
+
+    def _rx_parse_size_report(self, index, end):
+        """
+        Parse a cursor position report ``ESC [ rows ; columns R`` at index.
+
+        :return int: length of the report; ``0`` if it is none; ``-1`` if incomplete.
+        """
+        buffer = self._rx
+        pos = index + 1
+        if pos < end and buffer[pos] != 0x5B:
+            return 0
+        pos += 1
+        numbers = [0]
+        while pos < end:
+            value = buffer[pos]
+            if 0x30 <= value <= 0x39:
+                numbers[-1] = numbers[-1] * 10 + value - 0x30
+            elif value == 0x3B and len(numbers) == 1:
+                numbers.append(0)
+            elif value == 0x52 and len(numbers) == 2:
+                self._size_query_pending = False
+                self.console.set_size(numbers[1], numbers[0])
+                return pos + 1 - index
+            else:
+                return 0
+            pos += 1
+        return -1
+
+    def query_terminal_size(self):
+        """
+        Ask the terminal for its size.
+
+        the cursor is moved to the bottom right corner and its position is requested.
+        the answer is taken out of the input and set as console size.
+        (``columns`` & ``rows`` of `SharedConsole`)
+        """
+        self._size_query_pending = True
+        self._write(_ESC_SIZE_QUERY)
+
+    def _rx_handle_escape_timeout(self):
+        """Handle an incomplete escape sequence as normal input after escape_timeout."""
+        if (
+            self._esc_pending
+            and time.monotonic_ns() - self._esc_pending_ns
+            >= self.escape_timeout * 1000000000
+        ):
+            pending = self._esc_pending
+            self._esc_pending = b""
+            size = self._rx_reserve(len(pending))
+            self._rx[self._rx_end : self._rx_end + size] = pending[:size]
+            self._rx_end += size
+            self._input_buffer = None
+            self._rx_split_lines()
+            self._rx_check_line_length()
+            self.echo_print()
+
+    def _paste_begin(self, first_line):
+        if not self._paste_active:
+            self._paste_active = True
+            if not self._paste_summary_pending:
+                self._paste_first = first_line
+
+    def _paste_end(self):
+        if self._paste_active:
+            self._paste_active = False
+            self._paste_implicit = False
+            self._paste_last = self._lines_queued
+            self._paste_summary_pending = True
+
+    def _paste_is_silent(self, line_number):
+        """True if the line is part of a paste. (no echo)"""
+        if line_number < self._paste_first:
+            return False
+        return self._paste_active or line_number < self._paste_last
+
+    def _paste_summary_check(self):
+        """Print the paste summary after the last pasted line is handled."""
+        if self._paste_summary_pending and self._lines_dequeued >= self._paste_last:
+            self._paste_summary_pending = False
+            lines = self._paste_last - self._paste_first
+            self._paste_first = self._paste_last
+            if self.paste_summary_text:
+                self.print(self.paste_summary_text.format(lines=lines))
+
+    def _rx_handle_backspace(self, start):
+        """Handle backspace in the new data ``[start:_rx_end]``."""
+        self._rx_end = _remove_backspaces(self._rx, self._rx_start, start, self._rx_end)
+
+    def _rx_split_lines(self, end=None):
+        """
+        Move all complete lines from the receive buffer to the input queue.
+
+        :param int end: only search up to this index. (default: None - ``_rx_end``)
+        """
+        buffer = self._rx
+        matcher = self._rx_line_end_matcher
+        start = self._rx_start
+        if end is None:
+            end = self._rx_end
+        while True:
+            pos, length = matcher.search(buffer, start, end)
+            if pos < 0:
+                break
+            self._rx_complete_line(start, pos)
+            start = pos + length
+        if start != self._rx_start:
+            self._rx_start = start
+            self._input_buffer = None
+            if self.log_level <= LOG_DEBUG:
+                self.debug("rest: {!r}", self.input_buffer)
+                self.debug("self.input_list: {!r}", self.input_list)
+
+    def _rx_complete_line(self, line_start, line_end):
+        """Queue ``_rx[line_start:line_end]`` as completed line."""
+        max_length = self.max_line_length
+        if self._rx_overflow or (
+            max_length is not None and line_end - line_start > max_length
+        ):
+            if not self._rx_overflow:
+                self._overflow("line")
+            self._rx_overflow = False
+            if self.overflow_mode == "discard":
+                return
+            line_end = _utf8_complete_end(
+                self._rx, line_start, min(line_end, line_start + max_length)
+            )
+        if (self._priority_commands or self._priority_prefix) and self._rx_is_priority(
+            line_start, line_end
+        ):
+            self._priority_lines.append(bytes(self._rx[line_start:line_end]))
+            self._priority_times.append(self._rx_last_ns)
+            return
+        if self.input_handling_view and self.input_handling_fn:
+            self._rx_lines.append(line_start)
+            self._rx_lines.append(line_end)
+        else:
+            if (
+                self.buffer_size
+                and self._queued_bytes + line_end - line_start > self.buffer_size
+            ):
+                self._overflow("queue")
+                return
+            self.input_list.append(
+                self._decode(memoryview(self._rx)[line_start:line_end])
+            )
+        self._queued_bytes += line_end - line_start
+        self._lines_queued += 1
+        self._line_times.append(self._rx_last_ns)
+
+    def _rx_idle_pending(self):
+        """The incomplete line waits for the ``line_idle_timeout``."""
+        return (
+            self.line_idle_timeout is not None
+            and not self._paste_active
+            and self._rx_end - self._rx_start >= max(1, self.line_idle_min_length)
+        )
+
+    def _rx_handle_idle_timeout(self):
+        """Complete the pending line if nothing was received for line_idle_timeout."""
+        if (
+            self._rx_idle_pending()
+            and time.monotonic_ns() - self._rx_last_ns
+            >= self.line_idle_timeout * 1000000000
+        ):
+            self._rx_complete_line(self._rx_start, self._rx_end)
+            self._rx_start = self._rx_end
+            self._input_buffer = None
+            self._flow_control_check()
+            self.echo_print()
+
+    def _rx_check_line_length(self):
+        """Handle a too long incomplete line."""
+        max_length = self.max_line_length
+        if max_length is None or self._rx_end - self._rx_start <= max_length:
+            return
+        if not self._rx_overflow:
+            self._rx_overflow = True
+            self._overflow("line")
+        if self.overflow_mode == "discard":
+            self._rx_end = self._rx_start
+        else:
+            self._rx_end = _utf8_complete_end(
+                self._rx, self._rx_start, self._rx_start + max_length
+            )
+        self._input_buffer = None
+
+    def _overflow(self, kind):
+        """Count and report one dropped or truncated line."""
+        self.overflow_count += 1
+        self.debug("overflow: {} ({})", kind, self.overflow_count)
+        if self.overflow_fn:
+            self.overflow_fn(kind, self.overflow_count)
+
+    def _decode(self, buffer):
+        """Decode buffer - replace everything undecodable. (binary garbage)"""
+        return _decode(buffer, self.encoding)
+
+    def _pop_line(self):
+        """
+        Remove the oldest completed line.
+
+        :return tuple: (line, line_number); ``(None, None)`` if there is no line.
+        """
+        if self.input_list:
+            line = self.input_list.pop(0)
+            return (line, self._dequeued(len(line)))
+        if self._rx_lines:
+            start = self._rx_lines.pop(0)
+            end = self._rx_lines.pop(0)
+            line_number = self._dequeued(end - start)
+            return (self._decode(memoryview(self._rx)[start:end]), line_number)
+        return (None, None)
+
+    def _dequeued(self, size):
+        """
+        Update the queue bookkeeping after a line was removed.
+
+        :return int: sequence number of the removed line.
+        """
+        line_number = self._lines_dequeued
+        self._lines_dequeued += 1
+        times = self._line_times
+        self._line_taken(times.pop(0) if times else None)
+        if self.input_list or self._rx_lines:
+            self._queued_bytes = max(0, self._queued_bytes - size)
+        else:
+            # input_list is public - so resync if the queue is empty.
+            self._queued_bytes = 0
+            self._lines_dequeued = self._lines_queued
+            times.clear()
+        return line_number
+
+    def _line_taken(self, arrival_ns):
+        """Remember the arrival time of the line that is handled now."""
+        self.line_time_ns = arrival_ns
+        self.line_wait_ns = None
+        if arrival_ns is not None:
+            self.line_wait_ns = time.monotonic_ns() - arrival_ns
+            if self.profiler is not None and hasattr(self.profiler, "add"):
+                self.profiler.add("queue_wait", self.line_wait_ns)
+
+    @property
+    def buffered_bytes(self):
+        """Number of received bytes not handled yet. (queued lines & incomplete line)"""
+        return self._queued_bytes + self._rx_end - self._rx_start
+
+    @property
+    def buffered_lines(self):
+        """Number of completed lines not handled yet."""
+        return len(self.input_list) + (len(self._rx_lines) >> 1)
+
+    def _flow_control_check(self):
+        if self.flow_control:
+            self.flow_control.check(
+                self.serial, self.buffered_bytes, self.buffered_lines
+            )
 
     def _buffer_handle_cursor_position(self):
         # # TODO: implement Cursor position managment
@@ -288,71 +1253,1604 @@ class NonBlockingSerialInput:
         Otherwise an emtpy string.
 
         :return string: if available oldest input_line. otherwise ``""``
+
+        the arrival time of the returned line is available as ``line_time_ns``
+        and the time it waited in the queue as ``line_wait_ns``.
+        (the same is true inside the ``input_handling_fn``)
+
+        in request / response mode (``request_id_prefix``) the request id is removed
+        and the request is active until `request_done` or the next line.
         """
-        try:
-            result = self.input_list.pop(0)
-            if self.echo:
+        if self._priority_lines:
+            self.request_done()
+            result = self._decode(self._priority_lines.pop(0))
+            self._line_taken(self._priority_times.pop(0))
+            self._echo_input(result)
+            return self._request_begin(result)
+        result, line_number = self._pop_line()
+        if result is not None:
+            self.request_done()
+            self._flow_control_check()
+            if self._paste_is_silent(line_number):
+                self._paste_summary_check()
+            elif self.echo:
                 self.print(self.echo_pre_text, result)
             else:
                 self.print(result)
-            if self.verbose:
-                self.print("result: {}".format(repr(result)))
-        except IndexError:
-            result = None
+            result = self._request_begin(result)
+            if self._handle_log_command(result):
+                self.request_done()
+                return None
+            self.debug("result: {!r}", result)
         return result
 
+    ##########################################
+    # script
+
+    def run_script(self, path, *, lines_per_update=10, buffer_size=128):
+        """
+        Handle the lines of a file like received input.
+
+        the file is read in small chunks into a reusable buffer -
+        so it is never loaded completely.
+        every `update` handles at most ``lines_per_update`` lines
+        (with the ``input_handling_fn`` - or into ``input_list`` if the queue is empty)
+        so the main loop keeps running while a long script is handled.
+        lines longer than ``buffer_size`` are handled like too long input lines.
+        (see ``overflow_mode``)
+        a script that is still running is stopped.
+
+        :param string path: file to run. (``/commands.txt``)
+        :param int lines_per_update: maximum lines to handle per `update`. Default: 10
+        :param int buffer_size: size of the read buffer in bytes. Default: 128
+        """
+        self.script_stop()
+        if self._script_buffer is None or len(self._script_buffer) != buffer_size:
+            self._script_buffer = bytearray(buffer_size)
+        self._script_start = 0
+        self._script_end = 0
+        self._script_eof = False
+        self._script_skip = False
+        self.script_lines_per_update = lines_per_update
+        self.script_line_count = 0
+        # pylint: disable=consider-using-with
+        self._script_file = open(path, "rb")
+
+    @property
+    def script_running(self):
+        """A script started with `run_script` is not finished yet."""
+        return self._script_file is not None
+
+    def script_stop(self):
+        """Stop the running script."""
+        if self._script_file is not None:
+            self._script_file.close()
+            self._script_file = None
+
+    def _handle_script(self):
+        """Handle the next lines of the running script."""
+        if self._script_file is None:
+            return
+        budget = self.script_lines_per_update
+        if not self.input_handling_fn:
+            # do not fill the queue faster than it is read.
+            if self.input_list:
+                return
+            budget = 1
+        buffer = self._script_buffer
+        matcher = self._rx_line_end_matcher
+        longest = 1
+        for line_end in matcher.line_end_list:
+            longest = max(longest, len(line_end))
+        while budget > 0:
+            start = self._script_start
+            end = self._script_end
+            pos, length = matcher.search(buffer, start, end)
+            if pos >= 0 and not (
+                self._script_eof
+                or pos + longest <= end
+                or (start == 0 and end == len(buffer))
+            ):
+                # a longer line end (``"\r"`` -> ``"\r\n"``)
+                # could continue in the next chunk - read it first.
+                pos = -1
+            if pos >= 0:
+                self._script_start = pos + length
+                if self._script_skip:
+                    self._script_skip = False
+                else:
+                    self._script_line(start, pos)
+                    budget -= 1
+            elif self._script_eof:
+                if end > start and not self._script_skip:
+                    self._script_line(start, end)
+                self.script_stop()
+                return
+            else:
+                self._script_read()
+
+    def _script_read(self):
+        """Read the next chunk of the script into the free part of the buffer."""
+        buffer = self._script_buffer
+        start = self._script_start
+        end = self._script_end
+        if start == 0 and end == len(buffer):
+            # the line does not fit in the buffer.
+            if not self._script_skip:
+                self._script_skip = True
+                self._overflow("line")
+                if self.overflow_mode == "truncate":
+                    self._script_line(0, _utf8_complete_end(buffer, 0, end - 1))
+            start = end - 1
+        if start:
+            buffer[: end - start] = buffer[start:end]
+            end -= start
+            self._script_start = 0
+        count = self._script_file.readinto(memoryview(buffer)[end:])
+        if count:
+            end += count
+        else:
+            self._script_eof = True
+        self._script_end = end
+
+    def _script_line(self, start, end):
+        """Handle ``_script_buffer[start:end]`` like a received line."""
+        self.script_line_count += 1
+        view = memoryview(self._script_buffer)[start:end]
+        if not (self.input_handling_view and self.input_handling_fn):
+            view = self._decode(view)
+        if self.input_handling_fn:
+            # handled right away - it arrives now.
+            self._line_taken(time.monotonic_ns())
+            self._echo_input(view)
+            self._call_input_handling_fn(view)
+        else:
+            self.input_list.append(view)
+            self._queued_bytes += end - start
+            self._lines_queued += 1
+            self._line_times.append(time.monotonic_ns())
+
     ##########################################
     # main handling
 
+    def _rx_available(self):
+        """Number of bytes to read now - within the ``buffer_size`` budget."""
+        available = self.serial.in_waiting
+        if self.buffer_size:
+            # the queued lines use up the budget - leave the rest in the serial buffer.
+            available = min(available, self.buffer_size - self.buffered_bytes)
+        return max(0, available)
+
     def _handle_input(self):
-        if self.serial.connected:
-            available = self.serial.in_waiting
+        connected = self.serial.connected
+        if connected != self._connected:
+            self._connected = connected
+            self.console.set_connected(connected)
+            if connected and self.terminal_size_query:
+                self.query_terminal_size()
+        if connected:
+            available = self._rx_available()
             while available:
-                raw = self.serial.read(available)
-                text = raw.decode(self.encoding)
+                start = self._rx_read(available)
+                if start is None:
+                    # the receive buffer is full of unhandled lines -
+                    # leave the rest in the serial buffer.
+                    break
+                self._rx_last_ns = time.monotonic_ns()
+                # the echo line shows the input of the last typing instance.
+                self.console.focus = self
                 # self._buffer_handle_cursor_position()
-                self.input_buffer += text
-                self._buffer_handle_backspace()
-                if self.echo:
-                    self.print(content=None)
-                # decode: keyword argeuments and errors not supported by CircuitPython
-                # encoding=self.encoding,
-                # errors="strict",
-                self._buffer_check_and_handle_line_ends()
-                available = self.serial.in_waiting
+                self._rx_handle_backspace(start)
+                self._rx_handle_escape(start)
+                lines_before = self._lines_queued
+                self._rx_split_lines()
+                self._rx_check_line_length()
+                if (
+                    self.paste_line_threshold
+                    and self._lines_queued - lines_before >= self.paste_line_threshold
+                ):
+                    if not self._paste_active:
+                        self._paste_implicit = True
+                    self._paste_begin(lines_before)
+                self._flow_control_check()
+                if self.echo and not self._paste_active:
+                    if self.echo_incremental:
+                        self.console.echo_update(self)
+                    else:
+                        self.print(content=None)
+                available = self._rx_available()
+            if self._paste_implicit:
+                # no more data - the paste is over.
+                self._paste_end()
+            self._rx_handle_escape_timeout()
+            self._rx_handle_idle_timeout()
+            self._paste_summary_check()
 
     def _handle_input_handling_fn(self):
         parsed_input = False
         if self.input_handling_fn:
-            while self.input_list:
+            priority = self.priority_enabled
+            if self._priority_lines:
+                self._handle_priority()
+                parsed_input = True
+            # only the lines queued now - lines read in between wait for the next
+            # update. (a streaming host would keep this loop running forever)
+            count = len(self.input_list)
+            while count and self.input_list:
+                count -= 1
+                if priority:
+                    # check for new priority lines between the queued lines.
+                    self._handle_input()
+                    if self._priority_lines:
+                        self._handle_priority()
                 # first in first out
                 oldest_input = self.input_list.pop(0)
-                text = oldest_input
-                # isprintable is not implemented in CP
-                # if not text.isprintable():
-                #     text = repr(text)
-                if len(text) == 0:
-                    text = repr(text)
-                if self.echo:
-                    text = self.echo_pre_text + text
-                self.print(text)
-                self.input_handling_fn(oldest_input)
+                line_number = self._dequeued(len(oldest_input))
+                if not self._paste_is_silent(line_number):
+                    self._echo_input(oldest_input)
+                self._call_input_handling_fn(oldest_input)
                 parsed_input = True
+            if self._rx_lines:
+                self._handle_rx_lines()
+                parsed_input = True
+            self._flow_control_check()
+            self._paste_summary_check()
         if parsed_input and self.print_help_fn:
-            self.print_help_fn()
+            self._call_profiled("print_help_fn", self.print_help_fn)
             if self.echo or self.statusline:
                 self.print(content=None)
 
+    def _handle_rx_lines(self):
+        """Call input_handling_fn with a view of every completed line in _rx."""
+        rx_view = memoryview(self._rx)
+        lines = self._rx_lines
+        while lines:
+            start = lines.pop(0)
+            end = lines.pop(0)
+            line_number = self._dequeued(end - start)
+            line_view = rx_view[start:end]
+            if not self._paste_is_silent(line_number):
+                self._echo_input(line_view)
+            self._call_input_handling_fn(line_view)
+        # the views are invalid from now on.
+        line_view = None
+        rx_view = None
+        self._rx_compact()
+
+    def _echo_input(self, line):
+        """Print a received line. (line: string or memoryview)"""
+        # isprintable is not implemented in CP
+        # if not text.isprintable():
+        #     text = repr(text)
+        if len(line) == 0:
+            line = "''"
+        if self.echo:
+            # two writes - no need to concatenate.
+            self.print(self.echo_pre_text, line, sep="")
+        else:
+            self.print(line)
+
+    def _call_profiled(self, name, function, *args):
+        """Call function and report the time spent to the profiler (if any)."""
+        if self.profiler is None:
+            return function(*args)
+        token = self.profiler.begin(name)
+        try:
+            return function(*args)
+        finally:
+            self.profiler.end(name, token)
+
+    @property
+    def input_pending(self):
+        """True if there is received data or a line waiting to be handled."""
+        if self.input_list or self._rx_lines or self._priority_lines:
+            return True
+        return self.serial.connected and self.serial.in_waiting > 0
+
+    def time_until_next_work_ns(self):
+        """
+        Time until `update` has something to do.
+
+        :return int: time in ns; ``0`` if there is pending work right now;
+            ``None`` if there is nothing pending or scheduled.
+        """
+        if self.input_pending or self._script_file is not None:
+            return 0
+        result = self.scheduler.time_until_next_ns()
+        if self._esc_pending:
+            escape = max(
+                0,
+                self._esc_pending_ns
+                + int(self.escape_timeout * 1000000000)
+                - time.monotonic_ns(),
+            )
+            if result is None or escape < result:
+                result = escape
+        if self._rx_idle_pending():
+            idle = max(
+                0,
+                self._rx_last_ns
+                + int(self.line_idle_timeout * 1000000000)
+                - time.monotonic_ns(),
+            )
+            if result is None or idle < result:
+                result = idle
+        return result
+
     def update(self):
-        """Main update funciton. please call as often as possible."""
-        self._handle_input()
-        self._handle_input_handling_fn()
-        self._statusline_update_check_intervall()
+        """
+        Main update funciton. please call as often as possible.
+
+        the return value tells how long the main loop can sleep
+        without delaying any pending work. incoming data is buffered by the serial
+        connection in the meantime. (check `input_pending` to see if data is waiting.)
+
+        :return float: time in seconds until the next pending work
+            (``0`` if there is work to do right now);
+            ``None`` if there is nothing pending or scheduled.
+        """
+        self._call_profiled("handle_input", self._handle_input)
+        self._call_profiled("handle_input_handling_fn", self._handle_input_handling_fn)
+        if self._script_file is not None:
+            self._call_profiled("handle_script", self._handle_script)
+        self._call_profiled("scheduler", self.scheduler.run)
+        if self.telemetry is not None:
+            self._call_profiled("telemetry", self.telemetry.flush, self.console)
+        self.console.flush()
+        result = self.time_until_next_work_ns()
+        if result is not None:
+            result = result / 1000000000
+        return result
+
+    def sleep_until_next_work(self, maximum=0.1):
+        """
+        Sleep until the next pending work - but at most maximum seconds.
+
+        use together with `update` to free the cpu in the main loop.
+        ``maximum`` limits the reaction time to new serial input.
+
+        :param float maximum: maximum sleep time in seconds. (default: 0.1)
+        """
+        sleep_time = self.time_until_next_work_ns()
+        if sleep_time is None:
+            sleep_time = maximum
+        else:
+            sleep_time = min(sleep_time / 1000000000, maximum)
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+
+
+##########################################
+# console
+
+
+class SharedConsole:
+    """
+    Output arbiter for one console shared by several producers.
+
+    every `NonBlockingSerialInput` renders its output through a console.
+    by default each instance has a private one that draws immediately.
+    if several instances (or other code) write to the same terminal
+    create one SharedConsole and pass it as ``console`` to all instances -
+    so the statusline / echo redraws do not interfere.
+
+    all ``print`` calls are queued and drawn as one frame on `flush`
+    (called by every registered instance at the end of ``update()``):
+    the statusline & echo line are erased once, all queued output is written and
+    then the combined statusline of all instances and the echo line of the instance
+    that received input last (``focus``) are drawn again.
+
+    :param ~usb_cdc.Serial output: object with ``write(buffer)`` for all output.
+        Default: None (use the build in ``print`` - that is the console)
+    :param string encoding: output encoding. Default: "utf-8"
+    :param bool auto_flush: draw every print immediately. Default: False
+    :param string statusline_separator: put between the statuslines of the instances.
+        Default: " | "
+    :param bool threaded: allow ``print`` calls from other threads.
+        only the thread that created the console draws -
+        other threads just queue their output (with a short lock).
+        it is drawn in a batch by the next `flush` in the drawing thread.
+        (needs ``_thread`` - without it there is nothing to do.)
+        Default: False
+    :param int columns: terminal width - the statusline is cut and the echo line
+        scrolled to fit in one row. (so they do not wrap and break the redraw)
+        set by the instances with ``terminal_size_query``.
+        Default: None (unknown - no limit)
+    :param int scrollback_size: size in bytes of the scrollback buffer.
+        the last printed output is kept there - while the host is disconnected
+        nothing is written. (without scrollback the output is always written)
+        on connect the kept output is replayed in one write
+        followed by a full statusline & echo redraw.
+        (the instances report the connection state of their ``serial``)
+        Default: 0 (off)
+    """
+
+    def __init__(
+        self,
+        *,  # force keyword arguments
+        output=None,
+        encoding="utf-8",
+        auto_flush=False,
+        statusline_separator=" | ",
+        threaded=False,
+        scrollback_size=0,
+        columns=None,
+    ):
+        self.output = output
+        self.encoding = encoding
+        self.auto_flush = auto_flush
+        self.statusline_separator = statusline_separator
+        self.instances = []
+        # instance that owns the echo line
+        self.focus = None
+        # queued output: [args, sep, args, sep, ...]
+        self._queue = []
+        self._dirty = False
+        # what is on screen right now
+        self._drawn_statusline = False
+        self._drawn_echo = False
+        self._drawn_echo_text = None
+        self._print_shim_original = None
+        self._lock = None
+        self._owner = None
+        if threaded and _thread:
+            self._lock = _thread.allocate_lock()
+            self._owner = _thread.get_ident()
+        # output is only written if the host is connected
+        self.connected = True
+        # terminal size - None: unknown
+        self.columns = columns
+        self.rows = None
+        # scrollback: the last output - ``[0:_scrollback_end]`` (oldest first)
+        self._scrollback = None
+        self._scrollback_end = 0
+        if scrollback_size:
+            self._scrollback = bytearray(scrollback_size)
+
+    def register(self, instance):
+        """Add instance - its statusline & echo line are drawn by this console."""
+        if instance not in self.instances:
+            self.instances.append(instance)
+        if self.focus is None and instance.echo:
+            self.focus = instance
+
+    def unregister(self, instance):
+        """Remove instance."""
+        if instance in self.instances:
+            self.instances.remove(instance)
+        if self.focus is instance:
+            self.focus = None
+            for other in self.instances:
+                if other.echo:
+                    self.focus = other
+                    break
+        self._dirty = True
+
+    def print(self, *args, content=True, sep=" "):
+        r"""
+        Print args in the next frame.
+
+        :param object \*args: things to print.
+        :param bool content: if false just update statusline & echo (default: True).
+        :param string sep: separator between the args (default: " ").
+        """
+        if content and not (
+            self.auto_flush and (not self._lock or _thread.get_ident() == self._owner)
+        ):
+            # memoryviews point into the receive buffer - it changes until the flush.
+            args = _copy_views(args)
+        if self._lock:
+            with self._lock:
+                if content:
+                    self._queue.append(args)
+                    self._queue.append(sep)
+                self._dirty = True
+            if self.auto_flush and _thread.get_ident() == self._owner:
+                self.flush()
+            return
+        if content:
+            self._queue.append(args)
+            self._queue.append(sep)
+        self._dirty = True
+        if self.auto_flush:
+            self.flush()
+
+    def _take_queue(self):
+        if self._lock:
+            with self._lock:
+                queue = self._queue
+                self._queue = []
+                self._dirty = False
+            return queue
+        queue = self._queue
+        self._queue = []
+        self._dirty = False
+        return queue
+
+    def flush(self):
+        """
+        Draw all queued output - with a single statusline & echo redraw.
+
+        with ``threaded`` only the drawing thread draws - in all other threads
+        this does nothing.
+        """
+        if not self._dirty:
+            return
+        if self._lock and _thread.get_ident() != self._owner:
+            return
+        queue = self._take_queue()
+        if not self.connected and self._scrollback is not None:
+            # keep it for the replay - nobody is there to see it.
+            self._write_queue(queue, write=False)
+            return
+        write = self.write
+        statusline = self._get_statusline()
+        echo = self.focus is not None and self.focus.echo
+        if self._drawn_statusline and self._drawn_echo:
+            write(_ESC_CLEAR_TWO_LINES)
+        elif self._drawn_statusline or self._drawn_echo or echo or statusline:
+            write(_ESC_CLEAR_LINE)
+        else:
+            # nothing to redraw - just the plain output.
+            self._write_queue(queue)
+            return
+        self._write_queue(queue)
+        self._drawn_statusline = statusline is not None
+        self._drawn_echo = echo
+        if statusline is not None:
+            statusline = self._fit_statusline(statusline)
+            if isinstance(statusline, str):
+                write(statusline)
+            else:
+                self.write_buffer(statusline)
+            if echo:
+                write("\n")
+        self._drawn_echo_text = None
+        if echo:
+            write(_ESC_LINE_START)
+            # pylint: disable=protected-access
+            self._drawn_echo_text = self._fit_echo_line(self.focus._get_echo_line())
+            write(self._drawn_echo_text)
+
+    def echo_update(self, instance):
+        """
+        Draw the changed echo line of instance.
+
+        if only characters were added at the end (typing) and nothing else is
+        waiting to be drawn just the new characters are written.
+        otherwise this is a full redraw. (like ``print(content=None)``)
+        """
+        drawn = self._drawn_echo_text
+        if drawn is None or self._dirty or self.focus is not instance:
+            self.print(content=None)
+            return
+        # pylint: disable=protected-access
+        text = instance._get_echo_line()
+        if self.columns is not None and len(text) >= self.columns:
+            # needs scrolling
+            self.print(content=None)
+        elif len(text) > len(drawn) and text.startswith(drawn):
+            self.write(text[len(drawn) :])
+            self._drawn_echo_text = text
+        elif text != drawn:
+            self.print(content=None)
+
+    def set_size(self, columns, rows=None):
+        """Set the terminal size - everything is redrawn to fit."""
+        self.columns = columns
+        self.rows = rows
+        self._dirty = True
+
+    def _fit_statusline(self, statusline):
+        """Cut statusline to the terminal width."""
+        if self.columns is None or len(statusline) < self.columns:
+            return statusline
+        # the last column is left free - some terminals wrap when it is written.
+        if isinstance(statusline, str):
+            return statusline[: self.columns - 1]
+        return memoryview(statusline)[: self.columns - 1]
+
+    def _fit_echo_line(self, text):
+        """Scroll the echo line so the end of the input fits in the terminal width."""
+        width = self.columns
+        if width is None or len(text) < width:
+            return text
+        width -= 1
+        pre_text = self.focus.echo_pre_text
+        keep = width - len(pre_text) - 1
+        if keep < 1:
+            return text[len(text) - width :]
+        return pre_text + "<" + text[len(text) - keep :]
+
+    def set_connected(self, connected):
+        """
+        Set the connection state of the host.
+
+        on connect the scrollback is replayed and everything is redrawn.
+        """
+        if connected == self.connected:
+            return
+        self.connected = connected
+        if connected:
+            self.replay()
+        else:
+            self._drawn_echo_text = None
+
+    def replay(self):
+        """Write the scrollback in one go and redraw statusline & echo line."""
+        # the terminal content is unknown - start on a fresh line.
+        self.write(_ESC_CLEAR_LINE)
+        if self._scrollback_end:
+            self.write_buffer(memoryview(self._scrollback)[: self._scrollback_end])
+        self._drawn_statusline = False
+        self._drawn_echo = False
+        self._drawn_echo_text = None
+        self._dirty = True
+        self.flush()
+
+    def _scrollback_add(self, data):
+        """Append encoded data to the scrollback - drop the oldest lines if needed."""
+        buffer = self._scrollback
+        size = len(buffer)
+        length = len(data)
+        if length >= size:
+            buffer[:] = data[length - size :]
+            self._scrollback_end = size
+            return
+        end = self._scrollback_end
+        if end + length > size:
+            # drop at least half of the buffer - so this does not happen every line.
+            # (but never more than there is - length < size so the data fits then.)
+            drop = min(end, max(end + length - size, size // 2))
+            # and keep whole lines.
+            newline = buffer.find(b"\n", drop, end)
+            if newline >= 0:
+                drop = newline + 1
+            end -= drop
+            buffer[:end] = buffer[drop : drop + end]
+        buffer[end : end + length] = data
+        self._scrollback_end = end + length
+
+    def _scrollback_args(self, args, sep):
+        """Add args to the scrollback. (same format as `_write_args`)"""
+        encoding = self.encoding
+        add = self._scrollback_add
+        for index, arg in enumerate(args):
+            if index and sep:
+                add(sep.encode(encoding))
+            if isinstance(arg, memoryview):
+                add(arg)
+            else:
+                add(str(arg).encode(encoding))
+        add(b"\n")
+
+    def _get_statusline(self):
+        """Combined statusline of all instances - ``None`` if there is none."""
+        result = None
+        for instance in self.instances:
+            if instance.statusline:
+                # pylint: disable=protected-access
+                text = instance._get_statusline()
+                if result is None:
+                    result = text
+                else:
+                    if not isinstance(result, str):
+                        result = _decode(result, self.encoding)
+                    if not isinstance(text, str):
+                        text = _decode(text, self.encoding)
+                    result += self.statusline_separator + text
+        return result
+
+    def write(self, text):
+        """Write text to the output. (raw - no statusline / echo handling)"""
+        if self.output is None:
+            _builtin_print(text, end="")
+        else:
+            self.output.write(text.encode(self.encoding))
+
+    def write_buffer(self, buffer):
+        """Write encoded text from buffer to the output."""
+        if self.output is None:
+            _builtin_print(_decode(buffer, self.encoding), end="")
+        else:
+            self.output.write(buffer)
+
+    def _write_queue(self, queue, write=True):
+        """Write (or with ``write=False`` only keep in the scrollback) queued output."""
+        for index in range(0, len(queue), 2):
+            if write:
+                self._write_args(queue[index], queue[index + 1])
+            elif self._scrollback is not None:
+                self._scrollback_args(queue[index], queue[index + 1])
+
+    def _write_args(self, args, sep):
+        """Write args like the build in print does. (with line end)"""
+        if self._scrollback is not None:
+            self._scrollback_args(args, sep)
+        write = self.write
+        for index, arg in enumerate(args):
+            if index and sep:
+                write(sep)
+            if isinstance(arg, memoryview):
+                self.write_buffer(arg)
+            else:
+                write(str(arg))
+        write("\n")
+
+    def install_print_shim(self):
+        """
+        Route the build in ``print`` through this console.
+
+        only calls without ``file``, with the default ``end`` and without other
+        keywords (``flush``) are routed - all others go to the original ``print``.
+        (needs a firmware that allows to override builtins)
+        """
+        # pylint: disable=import-outside-toplevel
+        import builtins
+
+        if self._print_shim_original is not None:
+            return
+        original = builtins.print
+
+        def print_shim(*args, sep=" ", end="\n", file=None, **kwargs):
+            if file is None and end == "\n" and not kwargs:
+                self.print(*args, sep=sep)
+            else:
+                original(*args, sep=sep, end=end, file=file, **kwargs)
+
+        self._print_shim_original = original
+        builtins.print = print_shim
+
+    def remove_print_shim(self):
+        """Restore the build in ``print``."""
+        if self._print_shim_original is not None:
+            import builtins  # pylint: disable=import-outside-toplevel
+
+            builtins.print = self._print_shim_original
+            self._print_shim_original = None
+
+
+##########################################
+# flow control
+
+
+class FlowControl:
+    """
+    Pause the sender while too much received input is waiting to be handled.
+
+    pass an instance as ``flow_control`` to `NonBlockingSerialInput`.
+    if the buffered bytes or lines reach the high watermark the sender is paused -
+    it is released again if both are at or below the low watermarks.
+
+    modes:
+
+    * ``"xonxoff"``: send XOFF (``0x13``) / XON (``0x11``) over the serial connection.
+    * ``"rts"``: set the RTS pin. (for ``busio.UART`` connections)
+
+    :param string mode: ``"xonxoff"`` or ``"rts"``. Default: "xonxoff"
+    :param int high_bytes: pause at this number of buffered bytes. Default: 1024
+    :param int low_bytes: release at this number of buffered bytes. Default: 256
+    :param int high_lines: pause at this number of queued lines. Default: 32
+    :param int low_lines: release at this number of queued lines. Default: 4
+    :param ~digitalio.DigitalInOut rts: output pin for mode ``"rts"``. Default: None
+    :param bool rts_ready_value: pin value that signals *ready to receive*.
+        Default: False (RTS is active low)
+    """
+
+    XON = b"\x11"
+    XOFF = b"\x13"
+
+    def __init__(
+        self,
+        *,  # force keyword arguments
+        mode="xonxoff",
+        high_bytes=1024,
+        low_bytes=256,
+        high_lines=32,
+        low_lines=4,
+        rts=None,
+        rts_ready_value=False,
+    ):
+        if mode not in ("xonxoff", "rts"):
+            raise ValueError("mode must be 'xonxoff' or 'rts'")
+        if mode == "rts" and rts is None:
+            raise ValueError("mode 'rts' needs a rts pin")
+        self.mode = mode
+        self.high_bytes = high_bytes
+        self.low_bytes = low_bytes
+        self.high_lines = high_lines
+        self.low_lines = low_lines
+        self.rts = rts
+        self.rts_ready_value = rts_ready_value
+        self.paused = False
+        # how often the sender was paused
+        self.pause_count = 0
+        if self.rts is not None:
+            self.rts.value = self.rts_ready_value
+
+    def check(self, serial, buffered_bytes, buffered_lines):
+        """
+        Pause or release the sender depending on the buffer fill level.
+
+        :param ~usb_cdc.Serial serial: connection to send XON / XOFF to
+        :param int buffered_bytes: currently buffered bytes
+        :param int buffered_lines: currently queued lines
+        """
+        if self.paused:
+            if buffered_bytes <= self.low_bytes and buffered_lines <= self.low_lines:
+                self.paused = False
+                self._signal(serial)
+        elif buffered_bytes >= self.high_bytes or buffered_lines >= self.high_lines:
+            self.paused = True
+            self.pause_count += 1
+            self._signal(serial)
+
+    def _signal(self, serial):
+        if self.mode == "rts":
+            if self.paused:
+                self.rts.value = not self.rts_ready_value
+            else:
+                self.rts.value = self.rts_ready_value
+        elif self.paused:
+            serial.write(self.XOFF)
+        else:
+            serial.write(self.XON)
+
+
+##########################################
+# statusline
+
+
+class StatuslineTemplate:
+    """
+    Statusline with fixed width fields - parsed once.
+
+    the template is a format string - every field needs a width.
+    (``"temp:{temp: >6.1f} mode:{mode:<6}"``)
+    all literal text is encoded once into a buffer;
+    `set` formats a single value and writes it into its slot in place.
+    values that do not fit are shown as ``#``.
+    return ``buffer`` from the ``statusline_fn``
+    (or use the template itself as ``statusline_fn``) -
+    it is written without any further formatting.
+
+    :param string template: format string with fixed width fields.
+    :param string encoding: Default: "utf-8"
+    """
+
+    def __init__(self, template, *, encoding="utf-8"):
+        self.encoding = encoding
+        # name: [start, width, format]
+        self.slots = {}
+        parts = []
+        size = 0
+        index = 0
+        length = len(template)
+        while index < length:
+            char = template[index]
+            if char in "{}" and template[index + 1 : index + 2] == char:
+                # escaped brace
+                parts.append(char.encode(encoding))
+                size += 1
+                index += 2
+            elif char == "{":
+                end = template.index("}", index)
+                name, _, spec = template[index + 1 : end].partition(":")
+                width = self._spec_width(spec)
+                if not width:
+                    raise ValueError("field '{}' needs a width".format(name))
+                self.slots[name] = [size, width, "{:" + spec + "}"]
+                parts.append(b" " * width)
+                size += width
+                index = end + 1
+            elif char == "}":
+                raise ValueError("single '}' in template")
+            else:
+                end = index + 1
+                while end < length and template[end] not in "{}":
+                    end += 1
+                part = template[index:end].encode(encoding)
+                parts.append(part)
+                size += len(part)
+                index = end
+        self.buffer = bytearray(b"".join(parts))
+
+    @staticmethod
+    def _spec_width(spec):
+        """Width of a format spec. (``" >8.2f"`` -> 8)"""
+        index = 0
+        if len(spec) > 1 and spec[1] in "<>=^":
+            index = 2
+        elif spec and spec[0] in "<>=^":
+            index = 1
+        if index < len(spec) and spec[index] in "+- ":
+            index += 1
+        if index < len(spec) and spec[index] == "#":
+            index += 1
+        start = index
+        while index < len(spec) and spec[index] in "0123456789":
+            index += 1
+        if index == start:
+            return 0
+        return int(spec[start:index])
+
+    def set(self, name, value):
+        """Format value into the slot of field name."""
+        start, width, field_format = self.slots[name]
+        data = field_format.format(value).encode(self.encoding)
+        length = len(data)
+        if length > width:
+            data = b"#" * width
+        elif length < width:
+            data += b" " * (width - length)
+        self.buffer[start : start + width] = data
+
+    def update(self, **values):
+        """Set several fields."""
+        for name, value in values.items():
+            self.set(name, value)
+
+    def __call__(self):
+        """Buffer - so the template can be used as ``statusline_fn``."""
+        return self.buffer
+
+    def __str__(self):
+        return _decode(self.buffer, self.encoding)
+
+
+##########################################
+# telemetry
+
+
+class Telemetry:
+    """
+    Collect samples of named channels and write them in bulk.
+
+    pass an instance as ``telemetry`` to `NonBlockingSerialInput` -
+    the collected samples are written on every ``update()``.
+    `sample` only stores the value in a preallocated ring -
+    the formatting and writing is done later for all samples together.
+    if the ring is full the oldest samples are overwritten. (counted in ``dropped``)
+
+    formats:
+
+    * ``"csv"``: one line ``name,value`` per sample.
+      without ``output`` they are printed through the console -
+      as one block per update. (so the statusline & echo are redrawn only once)
+    * ``"binary"``: one frame per update: ``b"T"``, sample count (``uint16``)
+      and per sample the channel index (``uint8``) and the value (``float32``).
+      (all little endian - see `describe` for the channel names)
+      needs an ``output``.
+
+    for high rates use a separate ``output`` (like ``usb_cdc.data``) -
+    so the data does not mix with the interactive console.
+
+    :param ~usb_cdc.Serial output: object with ``write(buffer)``.
+        Default: None (print through the console)
+    :param string format: ``"csv"`` or ``"binary"``. Default: "csv"
+    :param int capacity: number of samples the ring can hold. Default: 256
+    :param int max_samples: maximum number of samples written per update.
+        Default: 64
+    :param string value_format: format for the values in ``"csv"``. Default: "{:.3f}"
+    """
+
+    def __init__(
+        self,
+        *,  # force keyword arguments
+        output=None,
+        format="csv",  # pylint: disable=redefined-builtin
+        capacity=256,
+        max_samples=64,
+        value_format="{:.3f}",
+    ):
+        if format not in ("csv", "binary"):
+            raise ValueError("format must be 'csv' or 'binary'")
+        if format == "binary" and output is None:
+            raise ValueError("format 'binary' needs an output")
+        self.output = output
+        self.format = format
+        self.max_samples = max_samples
+        self.value_format = value_format
+        self.names = []
+        self._decimation = []
+        self._countdown = []
+        # ring: value & channel index of every sample
+        self._values = array.array("f", (0.0 for _ in range(capacity)))
+        self._channels = bytearray(capacity)
+        self._head = 0
+        self._count = 0
+        # samples overwritten before they were written
+        self.dropped = 0
+        self._frame = None
+        if format == "binary":
+            self._frame = bytearray(3 + 5 * max_samples)
+            self._frame[0] = ord("T")
+
+    def add_channel(self, name, *, decimation=1):
+        """
+        Add a channel.
+
+        :param string name: channel name.
+        :param int decimation: keep only every n-th sample. Default: 1 (all)
+        :return int: channel index - to use with `sample`.
+        """
+        if len(self.names) >= 256:
+            raise ValueError("too many channels (max 256)")
+        self.names.append(name)
+        self._decimation.append(max(1, decimation))
+        self._countdown.append(1)
+        return len(self.names) - 1
+
+    def channel(self, name):
+        """Channel index of name."""
+        return self.names.index(name)
+
+    def sample(self, channel, value):
+        """
+        Add a sample.
+
+        :param int channel: channel index. (from `add_channel`)
+        :param float value: sample value.
+        """
+        countdown = self._countdown[channel] - 1
+        if countdown:
+            self._countdown[channel] = countdown
+            return
+        self._countdown[channel] = self._decimation[channel]
+        head = self._head
+        self._values[head] = value
+        self._channels[head] = channel
+        head += 1
+        if head == len(self._channels):
+            head = 0
+        self._head = head
+        if self._count < len(self._channels):
+            self._count += 1
+        else:
+            self.dropped += 1
+
+    @property
+    def pending(self):
+        """Number of samples waiting to be written."""
+        return self._count
+
+    def describe(self):
+        """Channel list ``index:name,...`` - to decode the binary frames."""
+        return ",".join(
+            "{}:{}".format(index, name) for index, name in enumerate(self.names)
+        )
+
+    def flush(self, console=None):
+        """
+        Write the waiting samples. (at most ``max_samples``)
+
+        :param SharedConsole console: console for ``"csv"`` without ``output``.
+        """
+        count = min(self._count, self.max_samples)
+        if not count:
+            return
+        capacity = len(self._channels)
+        index = self._head - self._count
+        if index < 0:
+            index += capacity
+        self._count -= count
+        values = self._values
+        channels = self._channels
+        if self._frame is not None:
+            frame = self._frame
+            struct.pack_into("<H", frame, 1, count)
+            offset = 3
+            for _ in range(count):
+                struct.pack_into("<Bf", frame, offset, channels[index], values[index])
+                offset += 5
+                index += 1
+                if index == capacity:
+                    index = 0
+            self.output.write(memoryview(frame)[:offset])
+            return
+        names = self.names
+        value_format = self.value_format
+        lines = []
+        for _ in range(count):
+            lines.append(
+                names[channels[index]] + "," + value_format.format(values[index])
+            )
+            index += 1
+            if index == capacity:
+                index = 0
+        if self.output is not None:
+            lines.append("")
+            self.output.write("\n".join(lines).encode("utf-8"))
+        elif console is not None:
+            console.print("\n".join(lines))
+
+
+##########################################
+# profiling
+
+
+class UpdateProfiler:
+    """
+    Collect timing statistics for the ``update()`` stages and user callbacks.
+
+    pass an instance as ``profiler`` to `NonBlockingSerialInput`.
+    stage names:
+    ``handle_input``, ``handle_input_handling_fn``, ``handle_script``, ``scheduler``,
+    ``telemetry``;
+    user callbacks:
+    ``input_handling_fn``, ``print_help_fn``, ``statusline_fn``.
+    the stage times include the time spent in the callbacks called by that stage.
+    ``queue_wait`` is the time from the arrival of a line until it is handled.
+
+    all times are measured with ``time.monotonic_ns()``.
+
+    :param float slow_threshold_ms: calls taking longer than this are reported
+        to ``slow_fn``. Default: None (disabled)
+    :param function slow_fn: callback for slow calls.
+        ``slow_fn(name: string, duration_ms: float)``
+        Default: None
+    """
+
+    def __init__(self, *, slow_threshold_ms=None, slow_fn=None):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.slow_fn = slow_fn
+        # name: [count, total_ns, max_ns]
+        self.stats = {}
+
+    def begin(self, _name):
+        """Start measurement - returns the token to pass to `end`."""
+        return time.monotonic_ns()
+
+    def end(self, name, token):
+        """Finish measurement started with `begin`."""
+        duration = time.monotonic_ns() - token
+        self.add(name, duration)
+
+    def add(self, name, duration_ns):
+        """Add one measured duration (in ns) to the statistics of name."""
+        try:
+            entry = self.stats[name]
+        except KeyError:
+            entry = [0, 0, 0]
+            self.stats[name] = entry
+        entry[0] += 1
+        entry[1] += duration_ns
+        if duration_ns > entry[2]:
+            entry[2] = duration_ns
+        if self.slow_fn and self.slow_threshold_ms is not None:
+            duration_ms = duration_ns / 1000000
+            if duration_ms > self.slow_threshold_ms:
+                self.slow_fn(name, duration_ms)
+
+    def reset(self):
+        """Clear all collected statistics."""
+        self.stats = {}
+
+    def report(self):
+        """
+        Format the collected statistics.
+
+        :return string: one line per name with count, average and max time in ms.
+        """
+        lines = []
+        for name in sorted(self.stats):
+            count, total, maximum = self.stats[name]
+            lines.append(
+                "{name: <26} n:{count: >7} avg:{avg: >9.3f}ms max:{max: >9.3f}ms".format(
+                    name=name,
+                    count=count,
+                    avg=total / count / 1000000,
+                    max=maximum / 1000000,
+                )
+            )
+        return "\n".join(lines)
+
+
+##########################################
+# scheduler
+
+
+class ScheduledTask:
+    """
+    One periodic or one-shot callback managed by a `Scheduler`.
+
+    use `Scheduler.call_every` or `Scheduler.call_later` to create tasks.
+
+    :param function function: callback to run. ``function(*args)``
+    :param int deadline_ns: next run time in ``time.monotonic_ns()`` units
+    :param int intervall_ns: repeat intervall in ns; ``None`` for one-shot tasks.
+    :param tuple args: arguments for function
+    """
+
+    def __init__(self, function, deadline_ns, intervall_ns=None, args=()):
+        self.function = function
+        self.deadline_ns = deadline_ns
+        self.intervall_ns = intervall_ns
+        self.args = args
+        self.active = True
+        # tie-breaker for tasks with the same deadline - set by the Scheduler
+        self.sequence = 0
+
+    @property
+    def intervall(self):
+        """Repeat intervall in seconds. (``None`` for one-shot tasks)"""
+        if self.intervall_ns is None:
+            return None
+        return self.intervall_ns / 1000000000
+
+    @intervall.setter
+    def intervall(self, value):
+        if value is None:
+            self.intervall_ns = None
+        else:
+            self.intervall_ns = int(value * 1000000000)
+
+    def cancel(self):
+        """Stop this task. it is removed from the scheduler lazily."""
+        self.active = False
+
+    def is_before(self, other):
+        """True if this task is due before other."""
+        if self.deadline_ns == other.deadline_ns:
+            return self.sequence < other.sequence
+        return self.deadline_ns < other.deadline_ns
+
+
+class Scheduler:
+    """
+    Deadline based scheduler for periodic and one-shot callbacks.
+
+    the tasks are kept in a min-heap ordered by deadline.
+    all times are tracked with ``time.monotonic_ns()`` -
+    so there is no precision loss on long running boards.
+    `NonBlockingSerialInput` runs its scheduler on every ``update()``.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._sequence = 0
+
+    def call_every(self, intervall, function, *args, delay=None):
+        """
+        Run function every intervall seconds.
+
+        :param float intervall: time between two runs in seconds
+        :param function function: callback. ``function(*args)``
+        :param float delay: time until the first run in seconds.
+            Default: None (= intervall)
+        :return ScheduledTask: the new task.
+        """
+        if delay is None:
+            delay = intervall
+        task = ScheduledTask(
+            function,
+            time.monotonic_ns() + int(delay * 1000000000),
+            int(intervall * 1000000000),
+            args,
+        )
+        self._push(task)
+        return task
+
+    def call_later(self, delay, function, *args):
+        """
+        Run function once after delay seconds.
+
+        :param float delay: time until the run in seconds
+        :param function function: callback. ``function(*args)``
+        :return ScheduledTask: the new task.
+        """
+        task = ScheduledTask(
+            function, time.monotonic_ns() + int(delay * 1000000000), None, args
+        )
+        self._push(task)
+        return task
+
+    @staticmethod
+    def cancel(task):
+        """Stop task."""
+        task.cancel()
+
+    def run(self):
+        """
+        Run all tasks that are due.
+
+        :return int: number of callbacks run.
+        """
+        now = time.monotonic_ns()
+        count = 0
+        heap = self._heap
+        while heap and heap[0].deadline_ns <= now:
+            task = self._pop()
+            if not task.active:
+                continue
+            if task.intervall_ns is not None:
+                # keep the rhythm - but skip runs we have missed completely.
+                task.deadline_ns += task.intervall_ns
+                if task.deadline_ns <= now:
+                    task.deadline_ns = now + task.intervall_ns
+                self._push(task)
+            else:
+                task.active = False
+            task.function(*task.args)
+            count += 1
+        return count
+
+    def time_until_next_ns(self):
+        """
+        Time until the next deadline.
+
+        :return int: time in ns (``0`` if a task is due); ``None`` if there are no tasks.
+        """
+        heap = self._heap
+        while heap and not heap[0].active:
+            self._pop()
+        if not heap:
+            return None
+        return max(0, heap[0].deadline_ns - time.monotonic_ns())
+
+    def time_until_next(self):
+        """
+        Time until the next deadline.
+
+        :return float: time in seconds (``0`` if a task is due);
+            ``None`` if there are no tasks.
+        """
+        result = self.time_until_next_ns()
+        if result is not None:
+            result = result / 1000000000
+        return result
+
+    def _push(self, task):
+        self._sequence += 1
+        task.sequence = self._sequence
+        heap = self._heap
+        heap.append(task)
+        # sift up
+        pos = len(heap) - 1
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            if not task.is_before(heap[parent]):
+                break
+            heap[pos] = heap[parent]
+            pos = parent
+        heap[pos] = task
+
+    def _pop(self):
+        heap = self._heap
+        last = heap.pop()
+        if not heap:
+            return last
+        result = heap[0]
+        # sift down
+        size = len(heap)
+        pos = 0
+        while True:
+            child = 2 * pos + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1].is_before(heap[child]):
+                child += 1
+            if not heap[child].is_before(last):
+                break
+            heap[pos] = heap[child]
+            pos = child
+        heap[pos] = last
+        return result
 
 
 ##########################################
 # helper
 
+# the original build in print - also if a print shim is installed.
+_builtin_print = print
+
+# precomputed escape sequences for the redraw.
+_ESC_ERASE_LINE = terminal.ANSIControl.erase_line(2)
+_ESC_PREVIOUS_LINE = terminal.ANSIControl.cursor.previous_line(1)
+_ESC_LINE_START = terminal.ANSIControl.cursor.horizontal_absolute(1)
+# erase the statusline or echo line
+_ESC_CLEAR_LINE = _ESC_ERASE_LINE + _ESC_LINE_START
+# erase the echo line and the statusline above it
+_ESC_CLEAR_TWO_LINES = (
+    _ESC_ERASE_LINE + _ESC_PREVIOUS_LINE + _ESC_ERASE_LINE + _ESC_LINE_START
+)
+
+
+def _decode(buffer, encoding):
+    """Decode buffer - replace everything undecodable. (binary garbage)"""
+    try:
+        return str(buffer, encoding)
+    except UnicodeError:
+        # decode: keyword argument errors not supported by CircuitPython
+        return "".join([chr(value) if value < 0x80 else "?" for value in buffer])
+
+
+_LOG_LEVEL_NAMES = {
+    "DEBUG": LOG_DEBUG,
+    "INFO": LOG_INFO,
+    "WARN": LOG_WARN,
+    "ERROR": LOG_ERROR,
+    "OFF": LOG_OFF,
+}
+_LOG_PREFIX = {
+    LOG_DEBUG: "DEBUG: ",
+    LOG_INFO: "",
+    LOG_WARN: "WARN: ",
+    LOG_ERROR: "ERROR: ",
+}
+_LOG_COLOR = {
+    LOG_DEBUG: terminal.ANSIColors.fg.darkgrey,
+    LOG_WARN: terminal.ANSIColors.fg.yellow,
+    LOG_ERROR: terminal.ANSIColors.fg.red,
+}
+_LOG_COLOR_RESET = terminal.ANSIColors.reset
+
+# save cursor, move to the bottom right corner, request the position, restore cursor
+_ESC_SIZE_QUERY = "\x1b7\x1b[999;999H\x1b[6n\x1b8"
+
+# bracketed paste mode
+# https://invisible-island.net/xterm/ctlseqs/ctlseqs.html#h2-Bracketed-Paste-Mode
+BRACKETED_PASTE_ENABLE = "\x1b[?2004h"
+BRACKETED_PASTE_DISABLE = "\x1b[?2004l"
+PASTE_START = b"\x1b[200~"
+PASTE_END = b"\x1b[201~"
+
+
+def _copy_views(args):
+    """Copy all memoryviews in args - so they can be written later."""
+    for arg in args:
+        if isinstance(arg, memoryview):
+            return tuple(
+                memoryview(bytes(arg)) if isinstance(arg, memoryview) else arg
+                for arg in args
+            )
+    return args
+
+
+def _find_byte(buffer, value, start, end):
+    """Index of the first value in ``buffer[start:end]``; ``-1`` if not found."""
+    for index in range(start, end):
+        if buffer[index] == value:
+            return index
+    return -1
+
+
+def _utf8_complete_end(buffer, start, end):
+    """End index of the last complete utf-8 character in ``buffer[start:end]``."""
+    index = end - 1
+    while index >= start and end - index < 4 and (buffer[index] & 0xC0) == 0x80:
+        index -= 1
+    if index < start:
+        return end
+    lead = buffer[index]
+    if lead >= 0xF0:
+        needed = 4
+    elif lead >= 0xE0:
+        needed = 3
+    elif lead >= 0xC0:
+        needed = 2
+    else:
+        return end
+    if end - index < needed:
+        return index
+    return end
+
+
+def _remove_backspaces(buffer, floor, start, end):
+    """
+    Remove backspace characters in ``buffer[start:end]`` - in place.
+
+    every backspace also removes the character before it - but nothing before floor.
+    (utf-8 aware)
+
+    :return int: the new end.
+    """
+    write = start
+    for index in range(start, end):
+        value = buffer[index]
+        if value == 0x08:
+            if write > floor:
+                write -= 1
+                # remove the complete utf-8 character
+                while write > floor and (buffer[write] & 0xC0) == 0x80:
+                    write -= 1
+        else:
+            if write != index:
+                buffer[write] = value
+            write += 1
+    return write
+
+
+def _scan_table(buffer, table, start, end):
+    """Index of the first byte in ``buffer[start:end]`` flagged in table; else end."""
+    for index in range(start, end):
+        if table[buffer[index]]:
+            return index
+    return end
+
+
+# the same kernels for the MicroPython viper code emitter.
+# compiled at import time - the pure python versions above are used
+# if the port has no native code emitter. (CPython, most CircuitPython boards)
+_VIPER_KERNELS = """
+@micropython.viper
+def _find_byte(buffer, value: int, start: int, end: int) -> int:
+    data = ptr8(buffer)
+    index = start
+    while index < end:
+        if data[index] == value:
+            return index
+        index += 1
+    return -1
+
+
+@micropython.viper
+def _remove_backspaces(buffer, floor: int, start: int, end: int) -> int:
+    data = ptr8(buffer)
+    write = start
+    index = start
+    while index < end:
+        value = data[index]
+        if value == 0x08:
+            if write > floor:
+                write -= 1
+                while write > floor and (data[write] & 0xC0) == 0x80:
+                    write -= 1
+        else:
+            if write != index:
+                data[write] = value
+            write += 1
+        index += 1
+    return write
+
+
+@micropython.viper
+def _scan_table(buffer, table, start: int, end: int) -> int:
+    data = ptr8(buffer)
+    flags = ptr8(table)
+    index = start
+    while index < end:
+        if flags[data[index]]:
+            return index
+        index += 1
+    return end
+"""
+
+
+def _load_native_kernels():
+    """Compile the viper kernels - ``None`` if this is not possible."""
+    if sys.implementation.name not in ("micropython", "circuitpython"):
+        return None
+    namespace = {}
+    try:
+        # pylint: disable=import-outside-toplevel
+        import micropython
+
+        namespace["micropython"] = micropython
+        # pylint: disable=exec-used
+        exec(_VIPER_KERNELS, namespace)
+    except Exception:  # pylint: disable=broad-except
+        # no native code emitter (SyntaxError) or no exec / micropython module.
+        return None
+    return namespace
+
+
+# both kernel sets by name - the native one is ``None`` if it is not available.
+# (the tests compare them)
+_KERNELS_PYTHON = {
+    "_find_byte": _find_byte,
+    "_remove_backspaces": _remove_backspaces,
+    "_scan_table": _scan_table,
+}
+_KERNELS_NATIVE = _load_native_kernels()
+if _KERNELS_NATIVE is not None:
+    _KERNELS_NATIVE = {name: _KERNELS_NATIVE[name] for name in _KERNELS_PYTHON}
+# True if the viper versions of the scanning kernels are used
+NATIVE_KERNELS = _KERNELS_NATIVE is not None
+if NATIVE_KERNELS:
+    globals().update(_KERNELS_NATIVE)
+
+
 """
 source for universal_line_end
 https://docs.python.org/3.8/library/stdtypes.html#str.splitlines
@@ -368,6 +2866,8 @@ universal_line_end_basic = [
     # Carriage Return + Line Feed
     "\r\n",
 ]
+# some of these are aliases of the same character -
+# they are removed by `normalize_line_end_list`.
 universal_line_end_advanced = [
     # Line Tabulation
     "\v",
@@ -390,68 +2890,283 @@ universal_line_end_advanced = [
 ]
 
 
+class LineEndMatcher:
+    r"""
+    Find any line end of a list in one pass.
+
+    the line ends are compiled once into an
+    `Aho-Corasick <https://en.wikipedia.org/wiki/Aho%E2%80%93Corasick_algorithm>`_
+    automaton - so the search cost does not depend on the number of line ends.
+    if line ends overlap (``"\r"`` and ``"\r\n"``) the leftmost and then longest
+    match wins.
+
+    works with ``str`` and with ``bytes`` line ends -
+    the searched text has to be of the same type.
+
+    the list is normalized first (see `normalize_line_end_list`)
+    the result is available as ``line_end_list`` and grouped by first character
+    as ``table``.
+
+    :param list line_end_list: list with line end strings.
+    """
+
+    def __init__(self, line_end_list):
+        self.table = line_end_table(line_end_list)
+        self.line_end_list = _table_to_list(self.table)
+        # trie: transitions, failure links, depth and
+        # length of the longest line end that ends in this state (0 = none)
+        goto = [{}]
+        fail = [0]
+        depth = [0]
+        out = [0]
+        # reversed trie for endswith: nested dicts - None key marks a line end.
+        self._reversed = {}
+        for line_end in self.line_end_list:
+            if not line_end:
+                continue
+            state = 0
+            for char in line_end:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    fail.append(0)
+                    depth.append(depth[state] + 1)
+                    out.append(0)
+                state = next_state
+            out[state] = len(line_end)
+            node = self._reversed
+            for index in range(len(line_end) - 1, -1, -1):
+                node = node.setdefault(line_end[index], {})
+            node[None] = line_end
+        # breadth first: compute failure links & inherit output.
+        queue = list(goto[0].values())
+        while queue:
+            state = queue.pop(0)
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                if state:
+                    fail[next_state] = goto[fallback].get(char, 0)
+                if not out[next_state]:
+                    out[next_state] = out[fail[next_state]]
+        self._goto = goto
+        self._fail = fail
+        self._depth = depth
+        self._out = out
+        # bytes line ends: flag table of the bytes that can start a line end -
+        # the search skips everything else with `_scan_table`.
+        self._first = None
+        if goto[0] and all(isinstance(char, int) for char in goto[0]):
+            self._first = bytearray(256)
+            for char in goto[0]:
+                self._first[char] = 1
+
+    def search(self, text, start=0, end=None):
+        """
+        Find the first line end in text.
+
+        :param text: string (or bytes) to search in
+        :param int start: start position for search. (default = 0)
+        :param int end: end position for search. (default = None: ``len(text)``)
+        :return tuple: (index, length) of the first line end;
+            ``(-1, 0)`` if nothing is found.
+        """
+        if end is None:
+            end = len(text)
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        first = self._first
+        if isinstance(text, str):
+            first = None
+        state = 0
+        best_start = -1
+        best_length = 0
+        index = start
+        while index < end:
+            if not state and first is not None:
+                index = _scan_table(text, first, index, end)
+                if index == end:
+                    break
+            char = text[index]
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            length = out[state]
+            if length:
+                match_start = index - length + 1
+                if (
+                    best_start < 0
+                    or match_start < best_start
+                    or (match_start == best_start and length > best_length)
+                ):
+                    best_start = match_start
+                    best_length = length
+            if best_start > -1 and (
+                # no later match can start at or before best_start
+                not goto[state]
+                or index - self._depth[state] + 1 > best_start
+            ):
+                break
+            index += 1
+        return (best_start, best_length)
+
+    def find(self, text, start=0):
+        """
+        Find the first line end in text.
+
+        :param text: string (or bytes) to search in
+        :param int start: start position for search. (default = 0)
+        :return int: index of first found line_end; ``-1`` if nothing is found.
+        """
+        return self.search(text, start)[0]
+
+    def endswith(self, text):
+        """
+        Check if text ends with a line end.
+
+        :param text: string (or bytes) to check
+        :return: the longest line end text ends with; ``None`` if there is none.
+        """
+        result = None
+        node = self._reversed
+        for index in range(len(text) - 1, -1, -1):
+            node = node.get(text[index])
+            if node is None:
+                break
+            result = node.get(None, result)
+        return result
+
+    def split(self, text):
+        """
+        Split text at all line ends.
+
+        see `splitlines_advanced`.
+
+        :param text: string (or bytes) to split
+        :return tuple: Tuple (result_list, rest);
+        """
+        result_list = []
+        rest = None
+        pos_last = 0
+        while True:
+            pos, length = self.search(text, pos_last)
+            if pos < 0:
+                break
+            result_list.append(text[pos_last:pos])
+            pos_last = pos + length
+        if pos_last < len(text):
+            rest = text[pos_last:]
+        return (result_list, rest)
+
+
+def line_end_table(line_end_list):
+    r"""
+    Build the canonical line end table.
+
+    empty and duplicated line ends are dropped (``"\v"`` and ``"\x0b"`` are the same).
+    the table maps the first character to all line ends starting with it -
+    ordered longest first.
+    the first characters keep the order of their first appearance.
+
+    :param list line_end_list: list with line end strings.
+    :return dict: ``{first_character: (line_end, ...)}``
+    """
+    groups = {}
+    order = []
+    for line_end in line_end_list:
+        if not line_end:
+            continue
+        first = line_end[0]
+        group = groups.get(first)
+        if group is None:
+            group = []
+            groups[first] = group
+            order.append(first)
+        if line_end not in group:
+            group.append(line_end)
+    table = {}
+    for first in order:
+        group = groups[first]
+        # longest first - stable for the same length.
+        group.sort(key=len, reverse=True)
+        table[first] = tuple(group)
+    return table
+
+
+def _table_to_list(table):
+    result = []
+    for group in table.values():
+        result.extend(group)
+    return result
+
+
+def normalize_line_end_list(line_end_list):
+    """
+    Deduplicate line_end_list and order it for longest match.
+
+    :param list line_end_list: list with line end strings.
+    :return list: canonical list - grouped by first character, longest first.
+    """
+    return _table_to_list(line_end_table(line_end_list))
+
+
+# shared compiled matchers - so all scanning functions use the same table.
+_LINE_END_MATCHER_CACHE = {}
+_LINE_END_MATCHER_CACHE_SIZE = 8
+
+
+def _get_line_end_matcher(line_end_list):
+    """Get a LineEndMatcher for line_end_list. (``None``: universal_line_end_basic)"""
+    if isinstance(line_end_list, LineEndMatcher):
+        return line_end_list
+    if line_end_list is None:
+        line_end_list = universal_line_end_basic
+    key = tuple(line_end_list)
+    try:
+        return _LINE_END_MATCHER_CACHE[key]
+    except KeyError:
+        if len(_LINE_END_MATCHER_CACHE) >= _LINE_END_MATCHER_CACHE_SIZE:
+            _LINE_END_MATCHER_CACHE.clear()
+        matcher = LineEndMatcher(line_end_list)
+        _LINE_END_MATCHER_CACHE[key] = matcher
+        return matcher
+
+
 # def find_first_line_end(input_string, line_end_list=None, start=0, return_line_end=False):
 def find_first_line_end(input_string, line_end_list=None, start=0):
     """
     Find first line_end from line_end_list in input_string.
 
     :param string input_string: input search
-    :param list line_end_list: list with strings to search for.
+    :param list line_end_list: list with strings to search for -
+        or a precompiled `LineEndMatcher`.
     :param int start: start position for search. (default = 0)
     :return int: index of first found line_end; ``-1`` if nothing is found.
     """
-    result = None
-    if line_end_list is None:
-        line_end_list = universal_line_end_basic
-    for line_end in line_end_list:
-        index = input_string.find(line_end, start)
-        # print("line_end: {: >10}; index: {}".format(repr(line_end), index))
-        # just remember the first / smallest index
-        if index > -1:
-            if result is None:
-                result = index
-            else:
-                result = min(index, result)
-    if result is None:
-        result = -1
-    return result
+    return _get_line_end_matcher(line_end_list).find(input_string, start)
 
 
 def splitlines_advanced(input_string, line_end_list=None):
-    """
+    r"""
     Split lines in input_string at all line_ends in line_end_list.
 
     This function searches for the all occurenc of all of strings in line_end_list.
     then splits at these points. the resulting list is returned.
     this also returns empty string segments.
-    the search happens in the order of line_end_list.
+    if line ends overlap at one position the longest wins (``"\r\n"`` over ``"\r"``).
     if the string does not end with a line_end symbol this last part will be returned in ``rest``
 
     :param string input_string: input to split
-    :param list line_end_list: list with strings where the splitting should happen.
+    :param list line_end_list: list with strings where the splitting should happen -
+        or a precompiled `LineEndMatcher`.
     :return tuple: Tuple (result_list, rest);
     """
-    if line_end_list is None:
-        line_end_list = universal_line_end_basic
-    result_list = []
-    rest = None
-    # we have to do the splitting manually as we have a list of available seperators..
-    pos_last = 0
-    while (
-        pos := find_first_line_end(input_string, line_end_list, start=pos_last)
-    ) > -1:
-        # print("pos: {}".format(repr(pos)))
-        # print("input_string[pos_last:pos]: {}".format(repr(input_string[pos_last:pos])))
-        result_list.append(input_string[pos_last:pos])
-        pos_last = pos + 1
-        # print("pos_last: {}".format(repr(pos_last)))
-    # print("pos_last: {}".format(repr(pos_last)))
-    # print("len(input_string): {}".format(repr(len(input_string))))
-    if pos_last < len(input_string):
-        # print("  rest handling:")
-        # print("input_string[pos_last:]: {}".format(repr(input_string[pos_last:])))
-        rest = input_string[pos_last:]
-    return (result_list, rest)
+    return _get_line_end_matcher(line_end_list).split(input_string)
 
 
 """
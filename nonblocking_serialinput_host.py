@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# SPDX-FileCopyrightText: Copyright (c) 2021 Stefan Krüger s-light.eu
+#
+# SPDX-License-Identifier: MIT
+"""
+`nonblocking_serialinput_host`
+================================================================================
+
+host CPython backends for `nonblocking_serialinput`.
+
+``usb_cdc.Serial`` like objects to run `NonBlockingSerialInput` on a desktop.
+this module is not needed on CircuitPython boards - so do not copy it there.
+
+
+* Author(s): Stefan Krüger
+
+Implementation Notes
+--------------------
+
+**Software and Dependencies:**
+
+* host CPython
+* `pyserial <https://pyserial.readthedocs.io/>`_ (only for `PySerialSerial`)
+"""
+
+import sys
+
+##########################################
+# host backends
+
+
+class StreamSerial:
+    """
+    ``usb_cdc.Serial`` like backend for host CPython.
+
+    reads non-blocking from a file descriptor (stdin, pty, pipe, socket)
+    using ``selectors`` - and writes to a second one.
+    this allows to run `nonblocking_serialinput.NonBlockingSerialInput` unchanged on a desktop.
+    pass the same object as ``serial`` and ``output``.
+
+    :param read_file: file object or file descriptor to read from.
+        Default: None (``sys.stdin``)
+    :param write_file: file object or file descriptor to write to.
+        Default: None (``sys.stdout``)
+    :param bool raw: switch a read terminal to cbreak mode -
+        so we get every key press and not only full lines. Default: True
+    :param int read_size: maximum bytes to read per system call. Default: 4096
+    """
+
+    def __init__(self, read_file=None, write_file=None, *, raw=True, read_size=4096):
+        # pylint: disable=import-outside-toplevel
+        # these are only available on host CPython.
+        import os
+        import selectors
+
+        self._os = os
+        if read_file is None:
+            read_file = sys.stdin
+        if write_file is None:
+            write_file = sys.stdout
+        self._fd_in = _fileno(read_file)
+        self._fd_out = _fileno(write_file)
+        self._selector = selectors.DefaultSelector()
+        try:
+            self._selector.register(self._fd_in, selectors.EVENT_READ)
+        except PermissionError:
+            # regular files can not be used with epoll - but with select.
+            self._selector = selectors.SelectSelector()
+            self._selector.register(self._fd_in, selectors.EVENT_READ)
+        self._read_size = read_size
+        self._buffer = bytearray()
+        self._termios_restore = None
+        # keep the other end of a pty open. (see `open_pty`)
+        self._peer_fd = None
+        self.timeout = 0
+        self.connected = True
+        if raw and os.isatty(self._fd_in):
+            import termios
+            import tty
+
+            self._termios_restore = termios.tcgetattr(self._fd_in)
+            tty.setcbreak(self._fd_in)
+            # the terminal should not echo - NonBlockingSerialInput does that.
+            attributes = termios.tcgetattr(self._fd_in)
+            attributes[3] &= ~termios.ECHO
+            termios.tcsetattr(self._fd_in, termios.TCSANOW, attributes)
+
+    @classmethod
+    def open_pty(cls, **kwargs):
+        """
+        Create a backend connected to a new pseudo terminal.
+
+        the returned device path can be opened by any terminal program or test
+        script (``screen /dev/pts/4``, ``pyserial``) just like a real board.
+
+        :return tuple: (StreamSerial, device_path)
+        """
+        # pylint: disable=import-outside-toplevel
+        import os
+        import tty
+
+        controller, peer = os.openpty()
+        tty.setraw(peer)
+        backend = cls(controller, controller, raw=False, **kwargs)
+        backend._peer_fd = peer
+        return backend, os.ttyname(peer)
+
+    def _poll(self):
+        while self.connected and self._selector.select(0):
+            try:
+                data = self._os.read(self._fd_in, self._read_size)
+            except OSError:
+                # pty: the other end is closed.
+                data = b""
+            if not data:
+                self.connected = False
+            self._buffer.extend(data)
+
+    @property
+    def in_waiting(self):
+        """Number of bytes available to read."""
+        self._poll()
+        return len(self._buffer)
+
+    def read(self, size=1):
+        """Read at most size bytes. never blocks."""
+        self._poll()
+        result = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return result
+
+    def readinto(self, buffer):
+        """Read at most ``len(buffer)`` bytes into buffer. never blocks."""
+        self._poll()
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        del self._buffer[:size]
+        return size
+
+    def write(self, buffer):
+        """Write all bytes of buffer."""
+        view = memoryview(buffer)
+        while view:
+            written = self._os.write(self._fd_out, view)
+            view = view[written:]
+        return len(buffer)
+
+    def close(self):
+        """Restore the terminal settings and release the selector."""
+        if self._termios_restore is not None:
+            import termios  # pylint: disable=import-outside-toplevel
+
+            termios.tcsetattr(self._fd_in, termios.TCSADRAIN, self._termios_restore)
+            self._termios_restore = None
+        self._selector.close()
+        if self._peer_fd is not None:
+            self._os.close(self._peer_fd)
+            self._peer_fd = None
+        self.connected = False
+
+
+class PySerialSerial:
+    """
+    ``usb_cdc.Serial`` like backend using `pyserial <https://pyserial.readthedocs.io/>`_.
+
+    connects to a real serial port on host CPython.
+    pass the same object as ``serial`` and ``output``.
+
+    :param string port: serial port name (``/dev/ttyACM0``, ``COM3``).
+    :param int baudrate: Default: 115200
+    :param ~serial.Serial connection: use an already open pyserial connection
+        instead of ``port``. Default: None
+    """
+
+    def __init__(self, port=None, *, baudrate=115200, connection=None):
+        if connection is None:
+            import serial as pyserial  # pylint: disable=import-outside-toplevel
+
+            connection = pyserial.Serial(port, baudrate=baudrate, timeout=0)
+        self.connection = connection
+
+    @property
+    def connected(self):
+        """True if the port is open."""
+        return self.connection.is_open
+
+    @property
+    def timeout(self):
+        """Read timeout in seconds."""
+        return self.connection.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self.connection.timeout = value
+
+    @property
+    def in_waiting(self):
+        """Number of bytes available to read."""
+        return self.connection.in_waiting
+
+    def read(self, size=1):
+        """Read at most size bytes."""
+        return self.connection.read(size)
+
+    def readinto(self, buffer):
+        """Read at most ``len(buffer)`` bytes into buffer."""
+        return self.connection.readinto(buffer)
+
+    def write(self, buffer):
+        """Write buffer."""
+        return self.connection.write(buffer)
+
+    def close(self):
+        """Close the port."""
+        self.connection.close()
+
+
+def _fileno(file):
+    if isinstance(file, int):
+        return file
+    return file.fileno()
@@ -0,0 +1,77 @@
+# SPDX-FileCopyrightText: Copyright (c) 2021 Stefan Krüger for s-light
+#
+# SPDX-License-Identifier: MIT
+
+"""Output drawn by a `SharedConsole`."""
+
+import nonblocking_serialinput as nbsi
+
+
+class FakeSerial:
+    """Serial with a fixed input - everything written is recorded."""
+
+    timeout = None
+
+    def __init__(self, data=b"", connected=True):
+        self.data = bytearray(data)
+        self.written = bytearray()
+        self.connected = connected
+
+    @property
+    def in_waiting(self):
+        return len(self.data)
+
+    def read(self, count=1):
+        result = bytes(self.data[:count])
+        del self.data[:count]
+        return result
+
+    def write(self, buffer):
+        self.written.extend(buffer)
+        return len(buffer)
+
+
+def test_view_echo_is_copied():
+    serial = FakeSerial(b"hello\nworld\nPARTIAL")
+    console = nbsi.SharedConsole(output=serial)
+    lines = []
+    my_input = nbsi.NonBlockingSerialInput(
+        input_handling_fn=lambda line: lines.append(bytes(line)),
+        input_handling_view=True,
+        serial=serial,
+        console=console,
+        statusline_intervall=None,
+        buffer_size=16,
+    )
+    my_input.update()
+    output = serial.written.decode("utf-8")
+    assert lines == [b"hello", b"world"]
+    assert ">> hello\n" in output
+    assert ">> world\n" in output
+
+
+def test_boot_disconnected():
+    serial = FakeSerial(connected=False)
+    my_input = nbsi.NonBlockingSerialInput(
+        serial=serial,
+        output=serial,
+        statusline_intervall=None,
+        scrollback_size=256,
+    )
+    my_input.update()
+    my_input.print("kept for later")
+    assert b"kept for later" not in serial.written
+    serial.connected = True
+    my_input.update()
+    assert b"kept for later" in serial.written
+
+
+def test_statusline_off_no_wakeup():
+    serial = FakeSerial()
+    my_input = nbsi.NonBlockingSerialInput(serial=serial, output=serial)
+    assert my_input.update() is None
+    my_input.statusline = True
+    assert my_input.time_until_next_work_ns() is not None
+    my_input.statusline = False
+    assert my_input.time_until_next_work_ns() is None
+    assert my_input.statusline_intervall == 1
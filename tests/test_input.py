@@ -0,0 +1,84 @@
+# SPDX-FileCopyrightText: Copyright (c) 2021 Stefan Krüger for s-light
+#
+# SPDX-License-Identifier: MIT
+
+"""Received lines are queued within the ``buffer_size`` budget."""
+
+import nonblocking_serialinput as nbsi
+
+
+class FakeSerial:
+    """Serial with a fixed input - everything written is dropped."""
+
+    connected = True
+    timeout = None
+
+    def __init__(self, data=b""):
+        self.data = bytearray(data)
+
+    @property
+    def in_waiting(self):
+        return len(self.data)
+
+    def read(self, count=1):
+        result = bytes(self.data[:count])
+        del self.data[:count]
+        return result
+
+    @staticmethod
+    def write(buffer):
+        return len(buffer)
+
+
+def test_budget_keeps_serial_data():
+    expected = ["line " + str(index) for index in range(10)]
+    serial = FakeSerial("".join(line + "\n" for line in expected).encode("utf-8"))
+    my_input = nbsi.NonBlockingSerialInput(
+        serial=serial,
+        output=serial,
+        echo=False,
+        statusline_intervall=None,
+        buffer_size=32,
+    )
+    my_input.update()
+    assert my_input.buffered_bytes <= 32
+    assert serial.in_waiting
+    lines = []
+    for _ in range(20):
+        my_input.update()
+        line = my_input.input()
+        if line is not None:
+            lines.append(line)
+    assert lines == expected
+    assert my_input.overflow_count == 0
+
+
+class StreamingSerial(FakeSerial):
+    """Serial that has one more line waiting - for the first 500 lines."""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    @property
+    def in_waiting(self):
+        if not self.data and self.count < 500:
+            self.count += 1
+            self.data.extend(b"data " + str(self.count).encode("utf-8") + b"\n")
+        return len(self.data)
+
+
+def test_priority_streaming_host():
+    lines = []
+    serial = StreamingSerial()
+    my_input = nbsi.NonBlockingSerialInput(
+        input_handling_fn=lines.append,
+        serial=serial,
+        output=serial,
+        echo=False,
+        statusline_intervall=None,
+        buffer_size=64,
+        priority_prefix="!",
+    )
+    my_input.update()
+    assert 0 < len(lines) < 20
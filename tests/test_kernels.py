@@ -0,0 +1,142 @@
+# SPDX-FileCopyrightText: Copyright (c) 2021 Stefan Krüger for s-light
+#
+# SPDX-License-Identifier: MIT
+
+"""
+The scanning kernels give the same results in all implementations.
+
+every test runs with the pure python kernels and -
+if ``NATIVE_KERNELS`` is set (MicroPython with viper emitter) - with the native ones.
+"""
+
+import random
+
+import pytest
+
+import nonblocking_serialinput as nbsi
+
+# pylint: disable=protected-access
+KERNEL_SETS = [pytest.param(nbsi._KERNELS_PYTHON, id="python")]
+if nbsi.NATIVE_KERNELS:
+    KERNEL_SETS.append(pytest.param(nbsi._KERNELS_NATIVE, id="native"))
+
+# ä is 2 bytes, € is 3 bytes in utf-8
+SAMPLE = "ab\bcä\b€\n\r\x1b[A\b\b".encode("utf-8")
+
+
+def random_buffers(count=300, seed=42):
+    generator = random.Random(seed)
+    alphabet = b"ab\n\r\x08\x1b" + "ä€".encode("utf-8")
+    for _ in range(count):
+        size = generator.randint(0, 24)
+        buffer = bytearray(generator.choice(alphabet) for _ in range(size))
+        start = generator.randint(0, size)
+        end = generator.randint(start, size)
+        floor = generator.randint(0, start)
+        yield buffer, floor, start, end
+
+
+# find_byte
+
+
+@pytest.mark.parametrize("kernels", KERNEL_SETS)
+def test_find_byte(kernels):
+    find_byte = kernels["_find_byte"]
+    buffer = bytearray(b"abc\nde\n")
+    assert find_byte(buffer, 0x0A, 0, len(buffer)) == 3
+    assert find_byte(buffer, 0x0A, 4, len(buffer)) == 6
+    assert find_byte(buffer, 0x0A, 4, 6) == -1
+    assert find_byte(buffer, 0x61, 0, 0) == -1
+    assert find_byte(bytearray(), 0x61, 0, 0) == -1
+
+
+@pytest.mark.parametrize("kernels", KERNEL_SETS)
+def test_find_byte_same_as_python(kernels):
+    find_byte = kernels["_find_byte"]
+    reference = nbsi._KERNELS_PYTHON["_find_byte"]
+    for buffer, _, start, end in random_buffers():
+        for value in (0x0A, 0x1B, 0x08, 0xC3):
+            expected = buffer.find(bytes([value]), start, end)
+            assert reference(buffer, value, start, end) == expected
+            assert find_byte(buffer, value, start, end) == expected
+
+
+# remove_backspaces
+
+
+@pytest.mark.parametrize("kernels", KERNEL_SETS)
+def test_backspaces(kernels):
+    remove_backspaces = kernels["_remove_backspaces"]
+    buffer = bytearray(b"abc\bd")
+    end = remove_backspaces(buffer, 0, 0, len(buffer))
+    assert buffer[:end] == b"abd"
+
+
+@pytest.mark.parametrize("kernels", KERNEL_SETS)
+def test_backspaces_floor(kernels):
+    remove_backspaces = kernels["_remove_backspaces"]
+    buffer = bytearray(b"ab\b\b\bc")
+    # "a" is before the floor - it has to stay.
+    end = remove_backspaces(buffer, 1, 1, len(buffer))
+    assert buffer[:end] == b"ac"
+
+
+@pytest.mark.parametrize("kernels", KERNEL_SETS)
+def test_backspaces_utf8(kernels):
+    remove_backspaces = kernels["_remove_backspaces"]
+    buffer = bytearray("aä€\b\b".encode("utf-8"))
+    end = remove_backspaces(buffer, 0, 0, len(buffer))
+    assert buffer[:end] == b"a"
+    buffer = bytearray("ä€\b".encode("utf-8"))
+    end = remove_backspaces(buffer, 0, 0, len(buffer))
+    assert buffer[:end].decode("utf-8") == "ä"
+
+
+@pytest.mark.parametrize("kernels", KERNEL_SETS)
+def test_backspaces_empty_range(kernels):
+    remove_backspaces = kernels["_remove_backspaces"]
+    buffer = bytearray(b"ab\b")
+    assert remove_backspaces(buffer, 0, 3, 3) == 3
+    assert remove_backspaces(buffer, 0, 1, 1) == 1
+    assert buffer == b"ab\b"
+
+
+@pytest.mark.parametrize("kernels", KERNEL_SETS)
+def test_backspaces_same_as_python(kernels):
+    remove_backspaces = kernels["_remove_backspaces"]
+    reference = nbsi._KERNELS_PYTHON["_remove_backspaces"]
+    for buffer, floor, start, end in random_buffers():
+        expected_buffer = bytearray(buffer)
+        expected_end = reference(expected_buffer, floor, start, end)
+        result_end = remove_backspaces(buffer, floor, start, end)
+        assert result_end == expected_end
+        assert buffer == expected_buffer
+
+
+# scan_table
+
+
+@pytest.mark.parametrize("kernels", KERNEL_SETS)
+def test_scan_table(kernels):
+    scan_table = kernels["_scan_table"]
+    table = bytearray(256)
+    table[0x0A] = 1
+    table[0x0D] = 1
+    buffer = bytearray(b"abc\r\n")
+    assert scan_table(buffer, table, 0, len(buffer)) == 3
+    assert scan_table(buffer, table, 4, len(buffer)) == 4
+    assert scan_table(buffer, table, 0, 3) == 3
+    assert scan_table(buffer, table, 2, 2) == 2
+
+
+@pytest.mark.parametrize("kernels", KERNEL_SETS)
+def test_scan_table_same_as_python(kernels):
+    scan_table = kernels["_scan_table"]
+    reference = nbsi._KERNELS_PYTHON["_scan_table"]
+    table = bytearray(256)
+    for value in b"\n\r\x1b":
+        table[value] = 1
+    for buffer, _, start, end in random_buffers():
+        expected = reference(buffer, table, start, end)
+        assert scan_table(buffer, table, start, end) == expected
+    assert reference(SAMPLE, table, 0, len(SAMPLE)) == SAMPLE.index(b"\n")
@@ -0,0 +1,98 @@
+# SPDX-FileCopyrightText: Copyright (c) 2021 Stefan Krüger for s-light
+#
+# SPDX-License-Identifier: MIT
+
+"""Request / response mode - the output of a request is tagged with its id."""
+
+import threading
+
+import nonblocking_serialinput as nbsi
+
+
+class FakeSerial:
+    """Serial with a fixed input - everything written is recorded."""
+
+    connected = True
+    timeout = None
+
+    def __init__(self, data=b""):
+        self.data = bytearray(data)
+        self.written = bytearray()
+
+    @property
+    def in_waiting(self):
+        return len(self.data)
+
+    def read(self, count=1):
+        result = bytes(self.data[:count])
+        del self.data[:count]
+        return result
+
+    def write(self, buffer):
+        self.written.extend(buffer)
+        return len(buffer)
+
+
+def create(data, **kwargs):
+    serial = FakeSerial(data)
+    my_input = nbsi.NonBlockingSerialInput(
+        serial=serial,
+        output=serial,
+        echo=False,
+        statusline_intervall=None,
+        log_command="log",
+        request_id_prefix="#",
+        **kwargs,
+    )
+    return my_input, serial
+
+
+def test_log_handling_fn():
+    lines = []
+    my_input, serial = create(
+        b"#42 log debug\r\n#43 hello\r\n", input_handling_fn=lines.append
+    )
+    my_input.update()
+    output = serial.written.decode("utf-8")
+    assert lines == ["hello"]
+    assert my_input.log_level == nbsi.LOG_DEBUG
+    assert output.index("#42 log: 10") < output.index("#42.") < output.index("#43.")
+
+
+def test_log_input():
+    my_input, serial = create(b"#42 log error\r\n#43 hello\r\n")
+    my_input.update()
+    assert my_input.input() is None
+    assert my_input.log_level == nbsi.LOG_ERROR
+    output = serial.written.decode("utf-8")
+    assert output.index("#42 log: 40") < output.index("#42.")
+    assert my_input.input() == "hello"
+    assert my_input.request_id == "43"
+
+
+def test_log_no_request():
+    lines = []
+    my_input, serial = create(b"log warn\r\n", input_handling_fn=lines.append)
+    my_input.update()
+    assert not lines
+    assert my_input.log_level == nbsi.LOG_WARN
+    assert "#" not in serial.written.decode("utf-8")
+
+
+def test_worker_thread_not_tagged():
+    worker_done = threading.Event()
+
+    def handle(line):
+        thread = threading.Thread(
+            target=lambda: (my_input.print("worker log"), worker_done.set())
+        )
+        thread.start()
+        worker_done.wait(1)
+        my_input.print("answer " + line)
+
+    my_input, serial = create(b"#7 hello\r\n", input_handling_fn=handle, threaded=True)
+    my_input.update()
+    output = serial.written.decode("utf-8")
+    assert "#7 answer hello" in output
+    assert "worker log" in output
+    assert "#7 worker log" not in output
@@ -0,0 +1,79 @@
+# SPDX-FileCopyrightText: Copyright (c) 2021 Stefan Krüger for s-light
+#
+# SPDX-License-Identifier: MIT
+
+"""`NonBlockingSerialInput.run_script` splits the file into the right lines."""
+
+import pytest
+
+import nonblocking_serialinput as nbsi
+
+
+class IdleSerial:
+    """Serial without input - everything written is dropped."""
+
+    connected = True
+    in_waiting = 0
+    timeout = None
+
+    @staticmethod
+    def read(_count=1):
+        return b""
+
+    @staticmethod
+    def write(buffer):
+        return len(buffer)
+
+
+def run_script(path, buffer_size):
+    lines = []
+    my_input = nbsi.NonBlockingSerialInput(
+        input_handling_fn=lines.append,
+        serial=IdleSerial(),
+        output=IdleSerial(),
+        echo=False,
+        statusline_intervall=None,
+    )
+    my_input.run_script(str(path), lines_per_update=3, buffer_size=buffer_size)
+    while my_input.script_running:
+        my_input.update()
+    return lines
+
+
+# every chunk boundary falls once between "\r" and "\n"
+@pytest.mark.parametrize("buffer_size", range(10, 28))
+def test_crlf_script(tmp_path, buffer_size):
+    expected = ["line " + str(index) for index in range(25)]
+    path = tmp_path / "script.txt"
+    path.write_bytes(("\r\n".join(expected) + "\r\n").encode("utf-8"))
+    assert run_script(path, buffer_size) == expected
+
+
+@pytest.mark.parametrize("buffer_size", range(4, 8))
+def test_mixed_line_ends(tmp_path, buffer_size):
+    path = tmp_path / "script.txt"
+    path.write_bytes(b"a\r\nb\rc\nd\r\n\r\ne")
+    assert run_script(path, buffer_size) == ["a", "b", "c", "d", "", "e"]
+
+
+def test_line_time(tmp_path):
+    path = tmp_path / "script.txt"
+    path.write_bytes(b"a\nb\n")
+    times = []
+    my_input = nbsi.NonBlockingSerialInput(
+        serial=IdleSerial(),
+        output=IdleSerial(),
+        echo=False,
+        statusline_intervall=None,
+    )
+    my_input.input_handling_fn = lambda line: times.append(
+        (my_input.line_time_ns, my_input.line_wait_ns)
+    )
+    my_input.line_time_ns = 1
+    my_input.run_script(str(path))
+    while my_input.script_running:
+        my_input.update()
+    assert len(times) == 2
+    for line_time_ns, line_wait_ns in times:
+        assert line_time_ns > 1
+        assert line_wait_ns is not None